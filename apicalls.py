@@ -1,23 +1,26 @@
-import os
+import io
 import json
+import asyncio
+import hashlib
+import functools
+import threading
+import itertools
 import time
 from urllib import parse
 import aiohttp
 
-from typing import Dict, Any
+from typing import Dict, List, Tuple, Optional, Any
 
 from alemibot import alemiBot
 
-import wikipediaapi
 import italian_dictionary
+from italian_dictionary.exceptions import WordNotFoundError
 import cryptocompare
 from PyDictionary import PyDictionary
 from udpy import UrbanClient
 from google_currency import convert
-from unit_converter.converter import converts
 from deep_translator import GoogleTranslator
 
-from pydub import AudioSegment
 import speech_recognition as sr
 
 from pyrogram import Client
@@ -26,10 +29,15 @@ from pyrogram.enums import ChatAction, ParseMode
 
 from alemibot.util.command import _Message as Message
 from alemibot.util import (
-	batchify, tokenize_json, sep, get_user, is_allowed, edit_or_reply, ProgressChatAction, filterCommand,
+	batchify, tokenize_json, sep, get_user, get_text, is_allowed, edit_or_reply, ProgressChatAction, filterCommand,
 	report_error, set_offline, cancel_chat_action, HelpCategory
 )
 
+from .util import (
+	get_session, throttle, run_blocking, TIMEOUTS, fetch_pages, pack_text, split_voice, convert_value, convert_batch, parse_values,
+	instrument, phase, normalize_query, RateTable, TTLCache, SingleFlight, LookupCache, ConversationStore, MicroBatcher, MISSING
+)
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -38,74 +46,124 @@ HELP = HelpCategory("APICALLS")
 recognizer = sr.Recognizer()
 dictionary = PyDictionary()
 UClient = UrbanClient()
+LOOKUP = LookupCache("data/lookup.db")
+TABLE_ROWS = 100 # longer conversion tables are sent as a file
 
 @HELP.add(cmd="<val> <from> <to>", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["convert", "conv"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def convert_cmd(client:alemiBot, message:Message):
 	"""convert various measure units
 
 	Conversion tool. Accepts many units, like `.convert 52 °C °F` \
 	or `.convert 2.78 daN*mm^2 mN*µm^2`.
+	Many values can be converted at once giving a list (`.convert 1,5,20 km mi`) or \
+	a range with optional step (`.convert 0..100:10 °C °F`), a table will be sent back (as a file if it's long).
 	"""
 	if len(message.command) < 3:
 		return await edit_or_reply(message, "`[!] → ` Not enough arguments")
-	res = converts(message.command[0] + " " + message.command[1], message.command[2])
-	await edit_or_reply(message, f"` → ` **{res}** {message.command[2]}")
+	val, src, dst = message.command[0], message.command[1], message.command[2]
+	if ".." not in val and "," not in val:
+		res = convert_value(val, src, dst)
+		return await edit_or_reply(message, f"` → ` **{res}** {dst}")
+	values = parse_values(val)
+	results = convert_batch(values, src, dst)
+	table = "\n".join(f"{v:>12.6g} {src} = {r:.6g} {dst}" for v, r in zip(values.tolist(), results.tolist()))
+	if len(values) > TABLE_ROWS or len(table) > 4000: # would not fit in a message
+		out = io.BytesIO(table.encode("utf-8"))
+		out.name = "conversion.txt"
+		return await client.send_document(message.chat.id, out, reply_to_message_id=message.id,
+										caption=f"` → ` **{len(values)}** values")
+	await edit_or_reply(message, f"` → ` **{len(values)}** values\n```\n{table}```")
+
+GOOGLE_RATES = RateTable()
+CRYPTO_RATES = RateTable() # kept apart so that `-crypto` never answers with google rates
+RATE_REFERENCE = 1e6 # google rounds converted amounts, convert a big one so the rate stays precise
+
+async def _google_rate(from_ticker:str, to_ticker:str) -> bool:
+	res = json.loads(await run_blocking("google_currency", convert, from_ticker, to_ticker, RATE_REFERENCE))
+	if not res["converted"]:
+		return False
+	GOOGLE_RATES.put(from_ticker, res["to"], float(res["amount"]) / RATE_REFERENCE)
+	return True
+
+def _cached_rate(tables:List[RateTable], from_ticker:str, to_ticker:str) -> Optional[float]:
+	for table in tables:
+		rate = table.get(from_ticker, to_ticker)
+		if rate is not None:
+			return rate
+	return None
 
 @HELP.add(cmd="<from> [<val>] [<to>]", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["currency", "cconvert", "curr"], flags=["-crypto"]))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def currency_convert_cmd(client:alemiBot, message:Message):
 	"""convert various currencies
 	
 	Currency price checker and conversion tool. Accept many currency tickers, like `.currency btc` \
-	or `.currency btc 20 eur`.
+	or `.currency btc 20 eur`. Many target currencies can be given separated by commas, like `.currency btc 1 eur,usd,gbp`.
 	Will use Google Currency for values, and if currency is not found there, cryptocompare.
 	Add flag `-crypto` to directly search cryptocompare.
+	Rates are cached for some minutes (set `ttl` in seconds under [currency] in config).
 	"""
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` Not enough arguments")
 	await client.send_chat_action(message.chat.id, ChatAction.CHOOSE_CONTACT)
+	GOOGLE_RATES.ttl = CRYPTO_RATES.ttl = client.config.getfloat("currency", "ttl", fallback=300.0)
 	val = float(message.command[1] or 1.0)
-	from_ticker = message.command[0]
-	to_ticker = message.command[2] or "USD"
-	converted_val = 0.0
-	res = {"converted" : False}
-	if not bool(message.command["-crypto"]):
-		res = json.loads(convert(from_ticker, to_ticker, val))
-	if res["converted"]:
-		to_ticker = res["to"]
-		converted_val = float(res["amount"])
-	else:
-		data = cryptocompare.get_price(from_ticker, currency=to_ticker)
-		if not data:
-			return await edit_or_reply(message, "`[!] → ` Invalid currency ticker")
-		from_ticker = list(res.keys())[0]
-		to_ticker = list(data[from_ticker].keys())[0]
-		converted_val = val * float(data[from_ticker][to_ticker])
-	await edit_or_reply(message, f"` → ` **{sep(converted_val)}** {to_ticker}")
+	from_ticker = message.command[0].upper()
+	to_tickers = [ t.strip().upper() for t in (message.command[2] or "USD").split(",") if t.strip() ]
+	only_crypto = bool(message.command["-crypto"])
+	tables = [CRYPTO_RATES] if only_crypto else [GOOGLE_RATES, CRYPTO_RATES]
+	missing = [ t for t in to_tickers if _cached_rate(tables, from_ticker, t) is None ]
+	if missing and not only_crypto:
+		found = await asyncio.gather(*(_google_rate(from_ticker, t) for t in missing))
+		missing = [ t for t, ok in zip(missing, found) if not ok ]
+	if missing: # a single cryptocompare call for everything google didn't know
+		data = await run_blocking("cryptocompare", cryptocompare.get_price, from_ticker, currency=missing)
+		if data and from_ticker in data:
+			for to_ticker, price in data[from_ticker].items():
+				CRYPTO_RATES.put(from_ticker, to_ticker, float(price))
+	out = ""
+	for to_ticker in to_tickers:
+		rate = _cached_rate(tables, from_ticker, to_ticker)
+		if rate is None:
+			out += f"`[!] → ` Invalid currency ticker `{to_ticker}`\n"
+		else:
+			out += f"` → ` **{sep(val * rate)}** {to_ticker}\n"
+	await edit_or_reply(message, out)
 
 @HELP.add(cmd="<word>", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["diz", "dizionario"]))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def diz_cmd(client:alemiBot, message:Message):
 	"""search in italian dictionary
 	
 	Get definition of given word from italian dictionary.
 	Will use www.dizionario-italiano.it.
+	Definitions are cached, so repeated lookups won't hit the website.
 	"""
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` No query given")
 	await client.send_chat_action(message.chat.id, ChatAction.UPLOAD_DOCUMENT)
 	arg = message.command.text
-	# Use this to get only the meaning 
-	res = italian_dictionary.get_definition(arg) 
+	res = LOOKUP.get("diz", arg)
+	if res is MISSING:
+		try:
+			res = await run_blocking("italian_dictionary", italian_dictionary.get_definition, arg)
+		except WordNotFoundError:
+			res = None
+		LOOKUP.set("diz", arg, res)
+	if res is None:
+		return await edit_or_reply(message, "` → No match`")
 
 	out = f"` → {res['lemma']} ` [ {' | '.join(res['sillabe'])} ]\n"
 	out += f"```{', '.join(res['grammatica'])} - {res['pronuncia']}```\n\n"
@@ -117,18 +175,24 @@ async def diz_cmd(client:alemiBot, message:Message):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def dic_cmd(client:alemiBot, message:Message):
 	"""search in english dictionary
 
 	Get definition of given word from English dictionary.
 	Will search on wordnet.princeton.edu.
+	Definitions are cached, so repeated lookups won't hit the website.
 	"""
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` No query given")
 	await client.send_chat_action(message.chat.id, ChatAction.UPLOAD_DOCUMENT)
 	arg = message.command.text
-	res = dictionary.meaning(arg)
-	if res is None:
+	res = LOOKUP.get("dic", arg)
+	if res is MISSING:
+		res = await run_blocking("pydictionary", dictionary.meaning, arg)
+		if res is not None: # PyDictionary returns None when the request failed, an empty dict when nothing was found
+			LOOKUP.set("dic", arg, res or None)
+	if not res:
 		return await edit_or_reply(message, "` → No match`")
 	out = ""
 	for k in res:
@@ -145,24 +209,33 @@ async def dic_cmd(client:alemiBot, message:Message):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def urbandict_cmd(client:alemiBot, message:Message):
 	"""search on urban dictionary
 	
 	Get definition from urban dictionary of given query.
 	Number of results to return can be specified with `-r`, \
 	will default to only one (top definition).
+	All results are cached, so asking for more with `-r` later won't search again.
 	"""
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` No query given")
 	n = int(message.command["results"] or 1)
 	await client.send_chat_action(message.chat.id, ChatAction.UPLOAD_DOCUMENT)
-	res = UClient.get_definition(message.command.text)
-	if len(res) < 1:
+	res = LOOKUP.get("ud", message.command.text)
+	if res is MISSING:
+		found = await run_blocking("udpy", UClient.get_definition, message.command.text)
+		res = [ {
+			"word" : d.word, "definition" : d.definition, "example" : d.example,
+			"upvotes" : d.upvotes, "downvotes" : d.downvotes,
+		} for d in found ]
+		LOOKUP.set("ud", message.command.text, res or None)
+	if not res:
 		return await edit_or_reply(message, "`[!] → ` Not found")
 	out = ""
 	for i in range(min(n, len(res))):
-		out +=  f"<code>→ </code> <u>{res[i].word}</u> <code>[+{res[i].upvotes}|{res[i].downvotes}-]</code>\n" + \
-				f"{res[i].definition}\n\n<i>{res[i].example}</i>\n\n"
+		out +=  f"<code>→ </code> <u>{res[i]['word']}</u> <code>[+{res[i]['upvotes']}|{res[i]['downvotes']}-]</code>\n" + \
+				f"{res[i]['definition']}\n\n<i>{res[i]['example']}</i>\n\n"
 	await edit_or_reply(message, out, parse_mode=ParseMode.HTML)
 
 @HELP.add(cmd="<query>", sudo=False)
@@ -173,6 +246,7 @@ async def urbandict_cmd(client:alemiBot, message:Message):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def wiki_cmd(client:alemiBot, message:Message):
 	"""search on wikipedia
 	
@@ -180,30 +254,59 @@ async def wiki_cmd(client:alemiBot, message:Message):
 	Language will default to english if not specified with `-l`.
 	By default, only first 1000 characters will be printed, a different amount \
 	can be specified with `-max`
+	Many pages can be searched at once separating titles with `|`, like `.wiki Python | Rust`.
 	"""
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` No query given")
 	lang = message.command["lang"] or "en"
 	limit = int(message.command["limit"] or 1000)
+	titles = [ t.strip() for t in message.command.text.split("|") if t.strip() ]
 	await client.send_chat_action(message.chat.id, ChatAction.UPLOAD_DOCUMENT)
-	Wikipedia = wikipediaapi.Wikipedia(lang)
-	page = Wikipedia.page(message.command.text)
-	if not page.exists():
-		return await edit_or_reply(message, "`[!] → ` No results")
-	text = page.text if len(page.summary) < limit else page.summary
-	if len(text) > limit:
-		text = text[:limit] + " ..."
-	await edit_or_reply(message, f"` → {page.title}`\n{text}\n` → ` {page.fullurl}")
+	pages = await fetch_pages(await get_session(client.config), lang, titles, limit=limit)
+	out = []
+	for title in titles:
+		page = pages[title]
+		if page is None:
+			out.append(f"`[!] → ` No results for `{title}`")
+			continue
+		text = page["text"]
+		if len(text) > limit:
+			text = text[:limit] + " ..."
+		out.append(f"` → {page['title']}`\n{text}\n` → ` {page['url']}")
+	await edit_or_reply(message, "\n\n".join(out))
+
+TRANSLATE_MAX_CHARS = 4500 # google refuses requests longer than 5000 characters
+TRANSLATIONS = TTLCache(maxsize=1024, ttl=24 * 3600)
+
+@functools.lru_cache(maxsize=32)
+def _translator(source:str, target:str) -> Tuple[GoogleTranslator, threading.Lock]:
+	# translators keep request params as state, so calls on the same instance must not overlap
+	return GoogleTranslator(source=source, target=target), threading.Lock()
+
+def _translate_sync(source:str, target:str, text:str) -> str:
+	translator, lock = _translator(source, target)
+	with lock:
+		return translator.translate(text=text)
+
+async def translate_text(source:str, target:str, text:str) -> str:
+	key = hashlib.sha1(f"{source}\0{target}\0{text}".encode("utf-8")).digest()
+	out = TRANSLATIONS.get(key)
+	if out is None:
+		out = await run_blocking("translator", _translate_sync, source, target, text)
+		TRANSLATIONS.set(key, out)
+	return out
 
 @HELP.add(cmd="[<text>]", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["translate", "tran", "tr"], options={
 	"src" : ["-s", "-src"],
 	"dest" : ["-d", "-dest"],
+	"batch" : ["-n"],
 # 	"engine" : ["-e", "-engine"]
 }))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def translate_cmd(client:alemiBot, message:Message): # TODO implement more engines from deep-translator
 	"""translate to/from
 
@@ -212,22 +315,41 @@ async def translate_cmd(client:alemiBot, message:Message): # TODO implement more
 	Will work with Google Translate.
 	Source language will be automatically detected if not specified otherwise.
 	Language codes can be 2 letters (`en`) or full word (`english`).
+	Translate many messages at once with `-n`: last `n` messages (at most 50) up to the one replied to \
+	(or to this one) will be translated together.
+	Long texts are split at sentence boundaries and sent in as few requests as possible.
 	"""
-	if len(message.command) < 1 and not message.reply_to_message:
+	if len(message.command) < 1 and not message.reply_to_message and "batch" not in message.command:
 		return await edit_or_reply(message, "`[!] → ` Nothing to translate")
-	tr_options : Dict[str, Any] = {}
-	# lmao I can probably pass **args directly
 	source_lang = message.command["src"] or "auto"
 	dest_lang = message.command["dest"] or "en"
 	await client.send_chat_action(message.chat.id, ChatAction.FIND_LOCATION)
-	q = message.reply_to_message.text if message.reply_to_message is not None else message.command.text
-	out = GoogleTranslator(source=source_lang, target=dest_lang).translate(text=q)
-	await edit_or_reply(message, "` → ` " + out)
+	if "batch" in message.command:
+		last_id = message.reply_to_message.id if message.reply_to_message is not None else message.id - 1
+		batchsize = max(min(int(message.command["batch"] or 10), 50), 1)
+		texts = []
+		async for msg in client.iter_history(message.chat.id, offset_id=last_id + 1, limit=batchsize):
+			if get_text(msg):
+				texts.append(get_text(msg))
+		texts.reverse() # history comes newest first
+		joiner = "\n\n"
+	elif message.reply_to_message is not None:
+		texts = [ get_text(message.reply_to_message) ]
+		joiner = "\n"
+	else:
+		texts = [ message.command.text ]
+		joiner = "\n"
+	if not any(texts):
+		return await edit_or_reply(message, "`[!] → ` Nothing to translate")
+	payloads = pack_text(texts, TRANSLATE_MAX_CHARS, joiner=joiner)
+	out = await asyncio.gather(*(translate_text(source_lang, dest_lang, p) for p, _ in payloads))
+	await edit_or_reply(message, "` → ` " + "".join(text + sep for text, (_, sep) in zip(out, payloads)))
 
 @HELP.add(cmd="<query>", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand("lmgtfy"))
 @report_error(logger)
 @set_offline
+@instrument
 async def lmgtfy(client:alemiBot, message:Message):
 	"""let me google that for you
 
@@ -243,6 +365,9 @@ async def lmgtfy(client:alemiBot, message:Message):
 WTTR_STRING = "`→ {loc} `\n` → `**{desc}**\n` → ` {mintemp:.0f}C - {maxtemp:.0f}C `|` **{hum}%** humidity\n" + \
 			  "` → ` pressure **{press}hPa** `|` wind **{wspd}m/s**\n` → ` **{vis}m** visibility (__{cld}% clouded__)"
 
+WEATHER_CACHE = TTLCache(maxsize=256, ttl=600)
+WEATHER_FLIGHTS = SingleFlight()
+
 @HELP.add(cmd="<location>", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["weather", "wttr"], options={
 	"lang" : ["-l", "-lang"]
@@ -250,12 +375,15 @@ WTTR_STRING = "`→ {loc} `\n` → `**{desc}**\n` → ` {mintemp:.0f}C - {maxtem
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def weather_cmd(client:alemiBot, message:Message):
 	"""get weather of location
 	
 	Makes a request to wttr.in for provided location. Props to https://github.com/chubin/wttr.in \
 	for awesome site, remember you can `curl wttr.in` in terminal.
 	Result language can be specified with `-l`.
+	Results are cached for 10 minutes and requests to wttr.in are spaced to at most 1 per second, \
+	change these with `ttl` and `rate` under [weather] in config.
 	"""
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` Not enough arguments")
@@ -265,10 +393,19 @@ async def weather_cmd(client:alemiBot, message:Message):
 	await client.send_chat_action(message.chat.id, ChatAction.FIND_LOCATION)
 	q = message.command.text
 	lang = message.command["lang"] or "en"
-
-	async with aiohttp.ClientSession() as sess: # TODO reuse session
-		async with sess.get(f"https://wttr.in/{q}?mnTC0&lang={lang}") as res:
-			text = await res.text()
+	key = (normalize_query(q), lang)
+
+	text = WEATHER_CACHE.get(key)
+	if text is None:
+		async def fetch() -> str:
+			await throttle("wttr.in", client.config.getfloat("weather", "rate", fallback=1.0))
+			sess = await get_session(client.config)
+			async with sess.get(f"https://wttr.in/{q}?mnTC0&lang={lang}") as res:
+				text = await res.text()
+				if res.status == 200:
+					WEATHER_CACHE.set(key, text, ttl=client.config.getfloat("weather", "ttl", fallback=600.0))
+			return text
+		text = await WEATHER_FLIGHTS.do(key, fetch)
 
 	await edit_or_reply(message, "<code> → " + text + "</code>", parse_mode=ParseMode.HTML)
 
@@ -289,6 +426,7 @@ async def weather_cmd(client:alemiBot, message:Message):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def transcribe_cmd(client:alemiBot, message:Message):
 	"""transcribes a voice message
 
@@ -296,25 +434,66 @@ async def transcribe_cmd(client:alemiBot, message:Message):
 	It will work without a key but usage may get limited. You can try to get a free key here: http://www.chromium.org/developers/how-tos/api-keys
 	If you have an API key, add it to your config under category [scribe] in a field named \"key\".
 	You can specify speech recognition language with `-l` (using `RFC5646` language tag format :`en-US`, `it-IT`, ...)
+	Long messages are split on silences and pieces are transcribed in parallel, text will appear as it's ready.
+	Pieces which could not be transcribed (quota, network errors) are marked with `[…]`.
+	Max piece length (`segment`, seconds) and how many are transcribed together (`parallel`) can be set under [scribe].
 	"""
 	await client.send_chat_action(message.chat.id, ChatAction.RECORD_AUDIO)
 	msg = await edit_or_reply(message, "`→ ` Working...")
-	path = None
 	lang = message.command["lang"] or "en-US"
-	if message.reply_to_message and message.reply_to_message.voice:
-		path = await client.download_media(message.reply_to_message)
-	elif message.voice:
-		path = await client.download_media(message)
-	else:
-		return await edit_or_reply(message, "`[!] → ` No audio given")
-	AudioSegment.from_ogg(path).export("data/voice.wav", format="wav")
-	os.remove(path)
-	voice = sr.AudioFile("data/voice.wav")
-	with voice as source:
-		audio = recognizer.record(source)
-	out = "` → `" + recognizer.recognize_google(audio, language=lang,
-						key=client.config.get("scribe", "key", fallback=None))
-	await edit_or_reply(msg, out)
+	key = client.config.get("scribe", "key", fallback=None)
+	with phase("download"):
+		if message.reply_to_message and message.reply_to_message.voice:
+			duration = message.reply_to_message.voice.duration
+			voice = await client.download_media(message.reply_to_message, in_memory=True)
+		elif message.voice:
+			duration = message.voice.duration
+			voice = await client.download_media(message, in_memory=True)
+		else:
+			return await edit_or_reply(message, "`[!] → ` No audio given")
+	with phase("decode"):
+		segments = await run_blocking("pydub", split_voice, voice,
+							max_len=client.config.getfloat("scribe", "segment", fallback=15.0),
+							timeout=max(TIMEOUTS["pydub"], (duration or 0) / 2))
+	results : List[Optional[str]] = [None] * len(segments)
+	errors : List[Exception] = []
+	limit = asyncio.Semaphore(client.config.getint("scribe", "parallel", fallback=4))
+
+	async def recognize(i:int, audio:sr.AudioData):
+		async with limit:
+			try:
+				results[i] = await run_blocking("speech_recognition", recognizer.recognize_google, audio, language=lang, key=key)
+			except sr.UnknownValueError: # nothing intelligible in this piece
+				results[i] = ""
+			except (sr.RequestError, asyncio.TimeoutError) as e: # keep the other pieces, mark the gap
+				logger.warning("Could not transcribe piece %d of voice message : %s", i, e)
+				errors.append(e)
+				results[i] = "[…]"
+
+	def ready_text() -> str: # only pieces without a gap before them, so text is always in order
+		return " ".join(r for r in itertools.takewhile(lambda r: r is not None, results) if r)
+
+	tasks = [ asyncio.create_task(recognize(i, audio)) for i, audio in enumerate(segments) ]
+	shown = ""
+	last_edit = time.time()
+	with phase("compute"):
+		try:
+			for done, fut in enumerate(asyncio.as_completed(tasks), start=1):
+				await fut
+				text = ready_text()
+				if done < len(tasks) and text != shown and time.time() - last_edit > 2.0:
+					await edit_or_reply(msg, f"` → [{done}/{len(tasks)}]` {text} ...")
+					shown = text
+					last_edit = time.time()
+		finally:
+			for t in tasks: # if one failed, don't leave others running
+				t.cancel()
+	if segments and len(errors) == len(segments):
+		return await edit_or_reply(msg, f"`[!] → ` Speech recognition failed : {errors[0]}")
+	text = ready_text()
+	if not text:
+		return await edit_or_reply(msg, "`[!] → ` Could not understand audio")
+	await edit_or_reply(msg, "` → `" + text)
 
 @HELP.add(sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["ocr"], options={
@@ -323,6 +502,7 @@ async def transcribe_cmd(client:alemiBot, message:Message):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def ocr_cmd(client:alemiBot, message:Message):
 	"""read text in photos
 
@@ -332,25 +512,36 @@ async def ocr_cmd(client:alemiBot, message:Message):
 	You can request OCR.space overlay in response with the `-overlay` flag.
 	A media can be attached or replied to.
 	Add the `-json` flag to get raw result.
+	Results are cached per media, so OCRing the same picture again (even forwarded) won't use up queries.
 	"""
-	payload = {
-		'isOverlayRequired': bool(message.command["-overlay"]),
-		'apikey': client.config.get("ocr", "apikey", fallback=""),
-		'language': message.command["lang"] or "eng",
-	}
-	if payload["apikey"] == "":
+	overlay = bool(message.command["-overlay"])
+	lang = message.command["lang"] or "eng"
+	apikey = client.config.get("ocr", "apikey", fallback="")
+	if apikey == "":
 		return await edit_or_reply(message, "`[!] → ` No API Key set up")
 	msg = message
 	if message.reply_to_message is not None:
 		msg = message.reply_to_message
 	if msg.media:
-		await client.send_chat_action(message.chat.id, ChatAction.UPLOAD_AUDIO)
-		fpath = await client.download_media(msg, file_name="data/ocr")
-		with open(fpath, 'rb') as f:
-			payload['file'] = f
-			async with aiohttp.ClientSession() as sess:
+		media = getattr(msg, msg.media.value, None)
+		uid = getattr(media, "file_unique_id", None)
+		query = f"{uid}|{lang}|{overlay}"
+		data = LOOKUP.get("ocr", query, exact=True) if uid else MISSING
+		if data is MISSING:
+			await client.send_chat_action(message.chat.id, ChatAction.UPLOAD_AUDIO)
+			with phase("download"):
+				img = await client.download_media(msg, in_memory=True)
+			payload = aiohttp.FormData()
+			payload.add_field("apikey", apikey)
+			payload.add_field("language", lang)
+			payload.add_field("isOverlayRequired", "true" if overlay else "false")
+			payload.add_field("file", img.getbuffer(), filename=img.name or "image.jpg")
+			with phase("compute"):
+				sess = await get_session(client.config)
 				async with sess.post('https://api.ocr.space/parse/image', data=payload) as res:
 					data = await res.json()
+			if uid and not data.get("IsErroredOnProcessing"): # don't waste quota on the same media again
+				LOOKUP.set("ocr", query, data, exact=True)
 		if message.command["-json"]:
 			raw = tokenize_json(json.dumps(data))
 			await edit_or_reply(message, f"` → `\n{raw}")
@@ -375,7 +566,33 @@ async def ocr_cmd(client:alemiBot, message:Message):
 # 	r = requests.get(f"https://www.linkexpander.com/?url={url}")
 # 	await edit_or_reply(message, r.text, parse_mode=None)
 
-_CONV : Dict[int, Dict[str, str]] = {} # cheap way to keep a history of conversations
+_CONV : Optional[ConversationStore] = None
+
+def _conversations(config) -> ConversationStore:
+	global _CONV
+	if _CONV is None:
+		_CONV = ConversationStore(
+			max_chars=config.getint("huggingface", "history_chars", fallback=2000),
+			max_users=config.getint("huggingface", "max_users", fallback=256),
+			idle_ttl=config.getfloat("huggingface", "idle", fallback=24 * 3600),
+			max_total_chars=config.getint("huggingface", "max_chars", fallback=200000),
+			path="data/hgf_conv.json" if config.getboolean("huggingface", "persist", fallback=False) else None,
+		)
+	return _CONV
+
+HGF_URL = "https://api-inference.huggingface.co/models/"
+_BATCHERS : Dict[Tuple[str, bool], MicroBatcher] = {}
+
+def _batcher(client:alemiBot, model:str, wait:bool) -> MicroBatcher:
+	if (model, wait) not in _BATCHERS:
+		async def send(inputs:List[Any]) -> Any:
+			headers = {"Authorization": f"Bearer api_{client.config.get('huggingface', 'key', fallback='')}"}
+			sess = await get_session(client.config)
+			async with sess.post(HGF_URL + model, headers=headers, json={ "wait_for_model" : wait, "inputs" : inputs }) as res:
+				return await res.json()
+		_BATCHERS[(model, wait)] = MicroBatcher(send, name=model,
+			window=client.config.getfloat("huggingface", "batch_window", fallback=0.05))
+	return _BATCHERS[(model, wait)]
 
 @HELP.add(cmd="[<payload>]")
 @alemiBot.on_message(is_allowed & filterCommand(["huggingface", "hgf"], options={
@@ -389,6 +606,7 @@ _CONV : Dict[int, Dict[str, str]] = {} # cheap way to keep a history of conversa
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def huggingface_cmd(client: Client, message: Message):
 	"""will query Huggingface Accelerated Interface API
 
@@ -397,6 +615,8 @@ async def huggingface_cmd(client: Client, message: Message):
 	The default model can be specified with `-m`. Default model will change depending on task
 	Some specific tasks are pre-programmed as options:
 	-	Use `-conv` to have a conversation (pass `--reset` as argument to reset ongoing). Defaults to `microsoft/DialoGPT-large`.
+		Only last messages are remembered (`history_chars` under [huggingface], default 2000 characters) and idle \
+		conversations are forgotten after a day (`idle`, in seconds). Set `persist = true` to keep them across restarts.
 	-	Use `-ask` to make a question, and specify the context inside `()`. Defaults to `deepset/roberta-base-squad2`.
 	-	Use `-sum` to make a summary of given text. Defaults to `facebook/bart-large-cnn`.
 	-	Use `-sent` to get sentiment analysis of text. Defaults to `distilbert-base-uncased-finetuned-sst-2-english`.
@@ -406,9 +626,10 @@ async def huggingface_cmd(client: Client, message: Message):
 	To access unsupported tasks, raw json input can be passed with no extra options. It will be fed as-is to requested model.
 	If raw json is being passed, default model will be gpt2.
 	Will report request time. This will include model load time and net latency. Add flag `-nowait` to fail if the model is not readily available.
+	Concurrent `-sum` and `-sent` requests for the same model are sent together in a single batch: reported time \
+	will be the batch one.
 	"""
 	uid = get_user(message).id
-	url = "https://api-inference.huggingface.co/models/"
 	headers = {"Authorization": f"Bearer api_{client.config.get('huggingface', 'key', fallback='')}"}
 	
 	payload : Dict[str, Any] = { "wait_for_model" : True, "inputs" : {} }
@@ -417,9 +638,9 @@ async def huggingface_cmd(client: Client, message: Message):
 
 	if message.command["conversation"]:
 		if message.command["conversation"] == "--reset":
-			_CONV.pop(uid, None)
+			_conversations(client.config).pop(uid)
 			return await edit_or_reply(message, "` → ` Cleared conversation")
-		payload["inputs"] = (_CONV[uid] if uid in _CONV else {})
+		payload["inputs"] = _conversations(client.config).get(uid)
 		payload["inputs"]["text"] = message.command["conversation"]
 		model = "microsoft/DialoGPT-large"
 	elif message.command["question"]:
@@ -451,21 +672,22 @@ async def huggingface_cmd(client: Client, message: Message):
 
 	before = time.time()
 	with ProgressChatAction(client, message.chat.id, action="typing") as prog:
-		async with aiohttp.ClientSession() as sess:
-			async with sess.post(url + model, headers=headers, json=payload) as res:
+		if message.command["summary"] or message.command["sentiment"]:
+			reply, batch = await _batcher(client, model, payload["wait_for_model"]).submit(payload["inputs"])
+			pre = f"` → ` [**{batch.elapsed:.1f}**s | batch of {batch.size}] "
+		else:
+			sess = await get_session(client.config)
+			async with sess.post(HGF_URL + model, headers=headers, json=payload) as res:
 				reply = await res.json()
-	inference_time = time.time() - before
-
-	if isinstance(reply, list): # cheap trick, sometimes it comes as list
-		reply = reply[0]
+			if isinstance(reply, list): # cheap trick, sometimes it comes as list
+				reply = reply[0]
+			pre = f"` → ` [**{time.time() - before:.1f}**s] "
 
 	if "error" in reply:
-		return await edit_or_reply(message, f"` → ` [**{inference_time:.1f}**s] {reply['error']}")
-
-	pre = f"` → ` [**{inference_time:.1f}**s] "
+		return await edit_or_reply(message, pre + reply['error'])
 
 	if message.command["conversation"]:
-		_CONV[uid] = reply["conversation"]
+		_conversations(client.config).set(uid, reply["conversation"])
 		await edit_or_reply(message, pre + reply["generated_text"])
 	elif message.command["question"]:
 		await edit_or_reply(message, pre + f'{reply["answer"]} | {reply["score"]:.3f}')
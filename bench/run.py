@@ -0,0 +1,178 @@
+"""offline micro-benchmarks for CPU bound transforms
+
+Runs image and text transforms from util/transforms.py on generated fixtures of a few sizes, no telegram \
+connection needed (only numpy, Pillow, qrcode, pyfiglet and zalgo_text). Run it from anywhere:
+
+	python bench/run.py                    # run everything, compare with bench/baseline.json if present
+	python bench/run.py -k fry -r 10       # only cases containing "fry", 10 repetitions each
+	python bench/run.py --save             # store results as new baseline
+
+Each case runs in its own interpreter, so fixtures and allocations of other cases don't interfere. Time is the \
+best of all repetitions, peak memory is how much the peak resident set size of that interpreter grew while running \
+the case, over the one reached importing modules and building fixtures.
+Exits with status 1 if any case got slower or used more memory than baseline by more than the tolerance.
+"""
+import gc
+import io
+import functools
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import importlib.util
+import subprocess
+
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = ROOT / "bench" / "baseline.json"
+
+IMAGE_SIZES = { "small" : (320, 240), "medium" : (1280, 960), "large" : (4000, 3000) }
+TEXT_SIZES = { "short" : 60, "medium" : 1000, "long" : 4000 }
+MEMORY_FLOOR = 4 << 20 # cases growing peak RSS by less than this are compared as if they did by this much
+WORDS = [ "meme", "gnu", "linux", "però", "così", "naïve", "über", "telegram", "bot", "città", "hello", "world" ]
+
+def load_transforms():
+	# just the module: importing the util package would also import every network library the bot uses
+	spec = importlib.util.spec_from_file_location("transforms", ROOT / "util" / "transforms.py")
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+@functools.lru_cache(maxsize=None)
+def make_image(width:int, height:int, seed:int = 0):
+	from PIL import Image
+	rng = random.Random(seed)
+	noise = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+	gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+	return Image.blend(gradient, noise, 0.3) # mostly smooth, like a photo, with some detail
+
+def encode_jpeg(img) -> bytes:
+	out = io.BytesIO()
+	img.save(out, "JPEG", quality=90)
+	return out.getvalue()
+
+def make_text(length:int, seed:int = 0) -> str:
+	rng = random.Random(seed)
+	out = ""
+	while len(out) < length:
+		out += rng.choice(WORDS) + rng.choice([" ", " ", " ", ". ", ", ", "\n"])
+	return out[:length]
+
+def build_cases(tr) -> Dict[str, Callable[[], Callable[[], Any]]]:
+	"""map case names to setups, which build fixtures only when called and return the function to time"""
+	cases : Dict[str, Callable[[], Callable[[], Any]]] = {}
+	for size, (w, h) in IMAGE_SIZES.items():
+		img = lambda w=w, h=h: make_image(w, h)
+		cases[f"fry/{size}"] = lambda img=img: functools.partial(tr.fry_image, img())
+		cases[f"fry/{size}/jpeg/c3"] = lambda img=img: functools.partial(tr.fry_bytes, encode_jpeg(img()), 3)
+		for width in (120, 500):
+			cases[f"ascii/{size}/w{width}"] = lambda img=img, width=width: functools.partial(tr.ascii_image, img(), new_width=width)
+		for colour in ("ansi", "html"):
+			cases[f"ascii/{size}/w500/{colour}"] = lambda img=img, colour=colour: functools.partial(tr.ascii_image, img(), new_width=500, colour=colour)
+	for size, length in TEXT_SIZES.items():
+		text = lambda length=length: make_text(length)
+		cases[f"zalgo/{size}"] = lambda text=text: functools.partial(tr.zalgofy, text(), noise=2, damage=0.5)
+		cases[f"randomcase/{size}"] = lambda text=text: functools.partial(tr.random_case, text())
+		if length <= 1000: # figlet and qr codes get huge quickly
+			cases[f"figlet/{size}"] = lambda text=text: functools.partial(tr.figlet, text(), font="slant", width=80)
+			cases[f"qrcode/{size}"] = lambda text=text: functools.partial(tr.make_qrcode, text())
+	for times in (10, 1000, 100000):
+		cases[f"rand/dice/{times}"] = lambda times=times: functools.partial(tr.roll_dice, times, 20)
+		cases[f"rand/choice/{times}"] = lambda times=times: functools.partial(tr.pick_choices, WORDS, times)
+	return cases
+
+def peak_rss() -> int:
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == "darwin" else peak * 1024 # kilobytes everywhere but on macOS
+
+def reset_peak_rss():
+	"""on linux, forget peak RSS reached so far (like building fixtures), so it starts again from current RSS"""
+	gc.collect()
+	try:
+		with open("/proc/self/clear_refs", "w") as f:
+			f.write("5")
+	except OSError:
+		pass # elsewhere fixtures may hide part of the peak
+
+def measure(func:Callable[[], Any], repeat:int) -> Dict[str, float]:
+	reset_peak_rss()
+	before = peak_rss()
+	times = []
+	for _ in range(repeat):
+		random.seed(0) # transforms using `random` will always take the same path
+		start = time.perf_counter()
+		func()
+		times.append(time.perf_counter() - start)
+	return { "time" : min(times), "mean" : sum(times) / len(times), "peak" : peak_rss() - before }
+
+def run_case(name:str, repeat:int) -> Dict[str, float]:
+	"""run a single case in a fresh interpreter, so peak RSS of other cases doesn't hide its own"""
+	proc = subprocess.run(
+		[ sys.executable, __file__, "--case", name, "-r", str(repeat) ],
+		stdout=subprocess.PIPE, check=True, text=True,
+	)
+	return json.loads(proc.stdout)
+
+def fmt_size(n:float) -> str:
+	for unit in ("B", "KB", "MB", "GB"):
+		if abs(n) < 1024:
+			return f"{n:.0f}{unit}"
+		n /= 1024
+	return f"{n:.1f}TB"
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="benchmark CPU bound transforms of alemibot-tricks")
+	parser.add_argument("-k", "--filter", default="", help="only run cases containing this string")
+	parser.add_argument("-r", "--repeat", type=int, default=5, help="repetitions for each case")
+	parser.add_argument("-t", "--tolerance", type=float, default=0.25, help="allowed slowdown or memory growth over baseline (0.25 = 25%%)")
+	parser.add_argument("-b", "--baseline", default=str(BASELINE), help="baseline file to compare with (or save to)")
+	parser.add_argument("--save", action="store_true", help="save results as new baseline")
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	parser.add_argument("--case", help=argparse.SUPPRESS) # used internally to run one case per interpreter
+	args = parser.parse_args()
+
+	if args.case:
+		print(json.dumps(measure(build_cases(load_transforms())[args.case](), args.repeat)))
+		return 0
+
+	baseline : Dict[str, Dict[str, float]] = {}
+	if Path(args.baseline).is_file():
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+
+	results : Dict[str, Dict[str, float]] = {}
+	regressions = []
+	for name in build_cases(None): # only names are needed here, keep this interpreter small
+		if args.filter not in name:
+			continue
+		res = results[name] = run_case(name, args.repeat)
+		line = f"{name:<24} {res['time'] * 1000:>10.2f}ms  (mean {res['mean'] * 1000:.2f}ms)  peak +{fmt_size(res['peak']):>6}"
+		if name in baseline:
+			delta = res["time"] / baseline[name]["time"] - 1.0
+			base_peak = baseline[name].get("peak", 0)
+			mem_delta = (res["peak"] - base_peak) / max(base_peak, MEMORY_FLOOR)
+			line += f"  {delta:+.0%} time {mem_delta:+.0%} memory vs baseline"
+			if delta > args.tolerance or mem_delta > args.tolerance:
+				line += "  [REGRESSION]"
+				regressions.append(name)
+		if not args.json:
+			print(line, flush=True)
+
+	if args.json:
+		print(json.dumps(results, indent=2))
+	if args.save:
+		baseline.update(results)
+		with open(args.baseline, "w") as f:
+			json.dump(baseline, f, indent=2, sort_keys=True)
+		print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+	if regressions:
+		print(f"{len(regressions)} cases slower or heavier than baseline: {', '.join(regressions)}", file=sys.stderr)
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
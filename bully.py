@@ -18,6 +18,8 @@ from alemibot.util import (
 	report_error, set_offline, HelpCategory
 )
 
+from .util import instrument
+
 logger = logging.getLogger(__name__)
 
 HELP = HelpCategory("BULLY")
@@ -66,6 +68,7 @@ async def attack_username(client, message, chat, username, interval, limit):
 }, flags=["-stop"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def steal_username_cmd(client:alemiBot, message:Message):
 	"""tries to claim an username
 
@@ -110,6 +113,7 @@ async def fake_typing(client, tgt, cycle_n, sleep_t, action, message):
 }, flags=["-stop"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def typing_cmd(client:alemiBot, message:Message):
 	"""show typing status in chat
 
@@ -146,6 +150,7 @@ async def typing_cmd(client:alemiBot, message:Message):
 @alemiBot.on_message(sudo & filterCommand("everyone"))
 @report_error(logger)
 @set_offline
+@instrument
 async def mass_mention(client:alemiBot, message:Message):
 	"""mention everyone in current chat
 
@@ -173,6 +178,7 @@ async def mass_mention(client:alemiBot, message:Message):
 @alemiBot.on_message(filters.private & sudo & filterCommand(["ss", "screenshot"], flags=["-0"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def screenshot_cmd(client:alemiBot, message:Message):
 	"""send screenshot notification
 
@@ -199,6 +205,7 @@ async def screenshot_cmd(client:alemiBot, message:Message):
 }, flags=["-stop"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def spam(client:alemiBot, message:Message): # TODO start another task so that it doesn't stop from rebooting
 	"""pretty self explainatory
 
@@ -26,10 +26,11 @@ from pydub import AudioSegment
 import speech_recognition as sr
 
 from PIL import Image
-import qrcode
 import pyfiglet
 from geopy.geocoders import Nominatim
 
+from .util import run_blocking, throttle, instrument, phase, tokenize, make_qrcode, figlet, roll_dice, pick_choices
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -48,6 +49,7 @@ HELP = HelpCategory("GENERATORS")
 }))
 @report_error(logger)
 @set_offline
+@instrument
 async def rand_cmd(client:alemiBot, message:Message):
 	"""get random choices
 
@@ -73,22 +75,13 @@ async def rand_cmd(client:alemiBot, message:Message):
 		times = int(message.command["batchsize"]) # overrule dice roller formatting
 		
 	if maxval is not None:
-		for _ in range(times):
-			res.append(secrets.randbelow(maxval) + 1)
+		res = roll_dice(times, maxval)
 		if times > 1:
 			out += f"`→ ` Rolled `{times}d{maxval}` : **{sum(res)}**\n"
 	elif len(message.command) > 0:
-		for _ in range(times):
-			res.append(secrets.choice(message.command.arg))
+		res, most_picked = pick_choices(message.command.arg, times)
 		if times > 1: # This is kinda ugly but pretty handy
-			res_count = Counter(res).most_common()
-			max_times = res_count[0][1]
-			out += "`→ Random choice ` **"
-			for el in res_count:
-				if el[1] < max_times:
-					break
-				out += el[0] + " "
-			out += "**\n"
+			out += "`→ Random choice ` **" + "".join(el + " " for el in most_picked) + "**\n"
 	else:
 		for _ in range(times):
 			res.append(secrets.randbelow(2))
@@ -111,6 +104,7 @@ async def rand_cmd(client:alemiBot, message:Message):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def qrcode_cmd(client:alemiBot, message:Message):
 	"""generate a qr code
 
@@ -128,27 +122,17 @@ async def qrcode_cmd(client:alemiBot, message:Message):
 	fg_color = message.command["front"] or "white"
 	prog = ProgressChatAction(client, message.chat.id, action="upload_photo")
 	await prog.tick()
-	qr = qrcode.QRCode(
-		version=size,
-		error_correction=qrcode.constants.ERROR_CORRECT_L,
-		box_size=box_size,
-		border=border,
-	)
-	qr.add_data(text)
-	qr.make(fit=True)
-
-	image = qr.make_image(fill_color=fg_color, back_color=bg_color)
-	qr_io = io.BytesIO()
-	qr_io.name = "qrcode.jpg"
-	image.save(qr_io, "JPEG")
-	qr_io.seek(0)
-	await client.send_photo(message.chat.id, qr_io, reply_to_message_id=message.id, progress=prog.tick)
+	with phase("compute"):
+		qr_io = make_qrcode(text, size=size, box_size=box_size, border=border, fg_color=fg_color, bg_color=bg_color)
+	with phase("upload"):
+		await client.send_photo(message.chat.id, qr_io, reply_to_message_id=message.id, progress=prog.tick)
 
 @HELP.add(cmd="( <hex> | <r> <g> <b> )", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["color"]))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def color_cmd(client:alemiBot, message:Message):
 	"""send a solid color image
 
@@ -182,6 +166,7 @@ async def color_cmd(client:alemiBot, message:Message):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def voice_cmd(client:alemiBot, message:Message):
 	"""convert text to voice
 
@@ -219,12 +204,15 @@ async def voice_cmd(client:alemiBot, message:Message):
 	elif not is_me(message):
 		opts["reply_to_message_id"] = message.id
 	await prog.tick()
-	gTTS(text=text, lang=lang, slow=slow).save("data/tts.mp3")
-	if message.command["-mp3"]:
-		await client.send_audio(message.chat.id, "data/tts.mp3", progress=prog.tick, **opts)
-	else:
-		AudioSegment.from_mp3("data/tts.mp3").export("data/tts.ogg", format="ogg", codec="libopus")
-		await client.send_voice(message.chat.id, "data/tts.ogg", progress=prog.tick, **opts)
+	with phase("compute"):
+		gTTS(text=text, lang=lang, slow=slow).save("data/tts.mp3")
+		if not message.command["-mp3"]:
+			AudioSegment.from_mp3("data/tts.mp3").export("data/tts.ogg", format="ogg", codec="libopus")
+	with phase("upload"):
+		if message.command["-mp3"]:
+			await client.send_audio(message.chat.id, "data/tts.mp3", progress=prog.tick, **opts)
+		else:
+			await client.send_voice(message.chat.id, "data/tts.ogg", progress=prog.tick, **opts)
 
 @HELP.add(cmd="(<lat> <long> | <loc>)", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["loc", "location"], options={
@@ -232,6 +220,7 @@ async def voice_cmd(client:alemiBot, message:Message):
 }))
 @report_error(logger)
 @set_offline
+@instrument
 async def location_cmd(client:alemiBot, message:Message):
 	"""send a location
 
@@ -247,7 +236,8 @@ async def location_cmd(client:alemiBot, message:Message):
 		longitude = float(message.command[1])
 	except (ValueError, IndexError):
 		await client.send_chat_action(message.chat.id, ChatAction.FIND_LOCATION)
-		location = geolocator.geocode(message.command.text)
+		await throttle("nominatim", 1.0) # Nominatim policy allows 1 request per second at most
+		location = await run_blocking("geopy", geolocator.geocode, message.command.text)
 		await client.send_chat_action(message.chat.id, ChatAction.CANCEL)
 		if location is None:
 			return await edit_or_reply(message, "`[!] → ` Not found")
@@ -269,6 +259,7 @@ async def location_cmd(client:alemiBot, message:Message):
 }, flags=["-list", "-rand"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def figlet_cmd(client:alemiBot, message:Message):
 	"""make a figlet art
 
@@ -293,13 +284,14 @@ async def figlet_cmd(client:alemiBot, message:Message):
 		if f != "" and f in FIGLET_FONTS:
 			font = f
 
-	result = pyfiglet.figlet_format(message.command.text, font=font, width=width)
+	result = figlet(message.command.text, font=font, width=width)
 	await edit_or_reply(message, "<code> →\n" + result + "</code>", parse_mode=ParseMode.HTML)
 
 @HELP.add(sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["fortune"], flags=["-cow"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def fortune_cmd(client:alemiBot, message:Message):
 	"""do you feel fortuname!?
 
@@ -339,6 +331,7 @@ async def check_firefox():
 @alemiBot.on_message(is_allowed & filterCommand(["webshot"], flags=["-raw"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def webshot_cmd(client:alemiBot, message:Message):
 	"""capture a website screenshot
 
@@ -376,6 +369,7 @@ async def webshot_cmd(client:alemiBot, message:Message):
 }))
 @report_error(logger)
 @set_offline
+@instrument
 async def cmd_frequency_iter(client:alemiBot, message:Message):
 	"""search most frequent words in messages
 
@@ -383,10 +377,11 @@ async def cmd_frequency_iter(client:alemiBot, message:Message):
 	Find most used words in last messages. If no number is given, will search only last 100 messages.
 	By default, 10 most frequent words are shown, but number of results can be changed with `-r`.
 	By default, only words of `len > 3` will be considered. A minimum word len can be specified with `-min`.
+	Words are letters and digits of any alphabet (accented words are counted whole), case is ignored.
 	Will search in current group or any specified with `-g`.
 	A single user can be specified with `-u` : only messages from that user will count if provided.
 	"""
-	results = int(message.command["results"] or 10)
+	results = max(int(message.command["results"] or 10), 1)
 	number = int(message.command[0] or 100)
 	min_len = int(message.command["minlen"] or 3)
 	group = None
@@ -400,19 +395,20 @@ async def cmd_frequency_iter(client:alemiBot, message:Message):
 		val = message.command["user"]
 		user = await client.get_users(int(val) if val.isnumeric() else val)
 	response = await edit_or_reply(message, f"` → ` Counting word occurrences...")
-	words = []
+	counter = Counter()
 	count = 0
 	async for msg in client.iter_history(group.id, limit=number):
-		if not user or user.id == msg.from_user.id:
-			words += [ w for w in re.sub(r"[^0-9a-zA-Z\s\n]+", "", get_text(msg).lower()).split() if len(w) > min_len ]
+		if not user or (msg.from_user is not None and user.id == msg.from_user.id): # channel posts have no from_user
+			counter.update(w for w in tokenize(get_text(msg)) if len(w) > min_len)
 		count += 1
 		if count % 250 == 0:
 			await client.send_chat_action(message.chat.id, ChatAction.PLAYING)
 			await response.edit(f"` → [{count}/{number}] ` Counting word occurrences...")
-	counter = Counter(words).most_common()
+	top = counter.most_common(results) # partial selection with a heap, no need to sort whole vocabulary
+	results = len(top) # may be less than requested
 	from_who = f"(from **{get_username(user)}**)" if user else ""
 	output = f"`→ {get_channel(group)}` {from_who}\n` → ` **{results}** most frequent words __(len > {min_len})__ in last **{number}** messages:\n"
 	for i in range(results):
-		output += f"`{i+1:02d}]{'-'*(results-i-1)}>` `{counter[i][0]}` `({counter[i][1]})`\n"
+		output += f"`{i+1:02d}]{'-'*(results-i-1)}>` `{top[i][0]}` `({top[i][1]})`\n"
 	await response.edit(output, parse_mode=ParseMode.MARKDOWN)
 
@@ -17,6 +17,8 @@ from sympy.plotting import plot3d, plot3d_parametric_line
 from sympy.parsing.sympy_parser import parse_expr
 from sympy import preview, plot
 
+from .util import instrument, phase
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -28,6 +30,7 @@ HELP = HelpCategory("MATH")
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def expr_cmd(client:alemiBot, message:Message):
 	"""convert to LaTeX formula
 
@@ -38,19 +41,22 @@ async def expr_cmd(client:alemiBot, message:Message):
 		return await edit_or_reply(message, "`[!] → ` No input")
 	expr = message.command.text
 	prog = ProgressChatAction(client, message.chat.id, action="upload_document")
-	if message.command["-latex"]:
-		preview(expr, viewer='file', filename='expr.png', dvioptions=["-T", "bbox", "-D 300", "--truecolor", "-bg", "Transparent"])
-	else:
-		res = parse_expr(expr)
-		preview(res, viewer='file', filename='expr.png', dvioptions=["-T", "bbox", "-D 300", "--truecolor", "-bg", "Transparent"])
-	await client.send_photo(message.chat.id, "expr.png", reply_to_message_id=message.id,
-									caption=f"` → {expr} `", progress=prog.tick)
+	with phase("compute"):
+		if message.command["-latex"]:
+			preview(expr, viewer='file', filename='expr.png', dvioptions=["-T", "bbox", "-D 300", "--truecolor", "-bg", "Transparent"])
+		else:
+			res = parse_expr(expr)
+			preview(res, viewer='file', filename='expr.png', dvioptions=["-T", "bbox", "-D 300", "--truecolor", "-bg", "Transparent"])
+	with phase("upload"):
+		await client.send_photo(message.chat.id, "expr.png", reply_to_message_id=message.id,
+										caption=f"` → {expr} `", progress=prog.tick)
 
 @HELP.add(cmd="<expr>", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["plot", "graph"], flags=["-3d"]))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def graph_cmd(client:alemiBot, message:Message):
 	"""plot provided function
 
@@ -62,21 +68,24 @@ async def graph_cmd(client:alemiBot, message:Message):
 	prog = ProgressChatAction(client, message.chat.id, action="upload_document")
 	expr = message.command.text
 	eq = []
-	for a in expr.split(", "):
-		eq.append(parse_expr(a).simplify())
+	with phase("compute"):
+		for a in expr.split(", "):
+			eq.append(parse_expr(a).simplify())
 
-	if message.command["-3d"]:
-		plot3d(*eq, show=False).save("graph.png")
-	else:
-		plot(*eq, show=False).save("graph.png")
+		if message.command["-3d"]:
+			plot3d(*eq, show=False).save("graph.png")
+		else:
+			plot(*eq, show=False).save("graph.png")
 	
-	await client.send_photo(message.chat.id, "graph.png", reply_to_message_id=message.id,
-									caption=f"` → {eq} `", progress=prog.tick)
+	with phase("upload"):
+		await client.send_photo(message.chat.id, "graph.png", reply_to_message_id=message.id,
+										caption=f"` → {eq} `", progress=prog.tick)
 
 @HELP.add(cmd="<expr>", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand("solve", flags=["-simpl"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def solve_cmd(client:alemiBot, message:Message):
 	"""attempt to solve equation
 
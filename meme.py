@@ -1,32 +1,216 @@
 import asyncio
-import secrets
-import random
 import html
 import os
 import io
 import re
+import hashlib
 
-from PIL import Image, ImageEnhance, ImageOps
+from PIL import Image
 
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 from pyrogram import filters
+from pyrogram.errors import BadRequest
 from pyrogram.types import InputMediaPhoto, InputMediaVideo
 
 from alemibot import alemiBot
 
 from alemibot.util.command import _Message as Message
 from alemibot.util import (
-	batchify, is_allowed, sudo, ProgressChatAction, edit_or_reply, is_me, send_media,
+	is_allowed, sudo, ProgressChatAction, edit_or_reply, is_me,
 	order_suffix, get_text, filterCommand, report_error, set_offline, cancel_chat_action, HelpCategory
 )
 
+from .util import (
+	instrument, phase, run_in_process, fry_bytes, ascii_image, dhash_file, dhash_files, similar, duplicate_groups,
+	stream_chunks, TextIndex, optimize_photo, transcode_video, strip_video, MUXERS, video_thumbnail, keep_original, media_kind, MemeIndex, MemeEntry, LookupCache, MISSING
+)
+
 import logging
 logger = logging.getLogger(__name__)
 
 HELP = HelpCategory("MEME")
 INTERRUPT = False
 
+MEMES = MemeIndex("plugins/alemibot-tricks/data/meme")
+PASTAS = MemeIndex("plugins/alemibot-tricks/data/pasta")
+PASTA_SEARCH = TextIndex(PASTAS.path, "data/pasta_index.json")
+
+# telegram keeps uploaded files: remember their file_id and send that instead of uploading again
+FILE_IDS = LookupCache("data/file_ids.db", ttl=365 * 24 * 3600)
+SENDERS = { "photo" : "send_photo", "animation" : "send_animation", "video" : "send_video", "audio" : "send_audio" }
+
+def _file_key(index:MemeIndex, meme:MemeEntry) -> str:
+	# a file replaced with the same name will have different size or mtime, so its old file_id won't be used
+	return hashlib.sha1(f"{index.path_of(meme)}:{meme.size}:{meme.mtime}".encode()).hexdigest()
+
+def _remember(key:str, sent:Message):
+	media = getattr(sent, sent.media.value, None) if sent is not None and sent.media else None
+	if media is not None:
+		FILE_IDS.set("file_id", key, media.file_id, exact=True)
+
+def _cached_id(key:str) -> Optional[str]:
+	file_id = FILE_IDS.get("file_id", key, exact=True)
+	return None if file_id is MISSING else file_id
+
+MARKDOWN_CHARS = str.maketrans("", "", "`*_[]~|")
+
+# perceptual hashes of photos, keyed like file ids. They're all compared on each .steal: loaded once in _HASH_TABLE
+HASHES = LookupCache("data/meme_hashes.db", max_entries=1000000, ttl=365 * 24 * 3600)
+_HASH_TABLE : Optional[Dict[str, Optional[int]]] = None
+HASH_CHUNK = 32 # files hashed by each process pool job
+HASH_TIMEOUT = 120.0 # for each chunk, counted from when it starts running
+_HASHING : Optional[asyncio.Future] = None
+
+def _pool_opts(client:alemiBot) -> dict: # process pool is shared with .fry
+	return {
+		"timeout" : client.config.getfloat("fry", "timeout", fallback=60.0),
+		"workers" : client.config.getint("fry", "workers", fallback=2),
+	}
+
+def _hash_table() -> Dict[str, Optional[int]]:
+	global _HASH_TABLE
+	if _HASH_TABLE is None: # a single query, instead of one (and a commit) for each photo
+		_HASH_TABLE = HASHES.load("dhash")
+	return _HASH_TABLE
+
+def _store_hashes(values:Dict[str, Optional[int]]):
+	HASHES.set_many("dhash", values, exact=True)
+	_hash_table().update(values)
+
+def stored_hashes(index:MemeIndex) -> Tuple[Dict[str, int], List[MemeEntry]]:
+	"""hashes already computed for photos in collection, and photos which don't have one yet"""
+	table = _hash_table()
+	hashes : Dict[str, int] = {}
+	missing : List[MemeEntry] = []
+	for name in index.names(kind="photo"):
+		meme = index.get(name)
+		value = table.get(_file_key(index, meme), MISSING)
+		if value is MISSING:
+			missing.append(meme)
+		elif value is not None: # None marks files which can't be read as images
+			hashes[name] = value
+	return hashes, missing
+
+async def photo_hashes(client:alemiBot, index:MemeIndex) -> Dict[str, int]:
+	"""perceptual hash of every photo in collection, new ones are computed in process pool"""
+	hashes, missing = stored_hashes(index)
+	workers = client.config.getint("fry", "workers", fallback=2) # process pool is shared with .fry
+	limit = asyncio.Semaphore(max(workers - 1, 1)) # leave a worker free for other commands
+	async def run(chunk:List[MemeEntry]):
+		async with limit:
+			try:
+				values = await run_in_process(dhash_files, [ index.path_of(meme) for meme in chunk ],
+												timeout=HASH_TIMEOUT, workers=workers)
+			except asyncio.TimeoutError:
+				logger.warning("Hashing %d memes took more than %.0fs, skipping them", len(chunk), HASH_TIMEOUT)
+				return
+		_store_hashes({ _file_key(index, meme) : value for meme, value in zip(chunk, values) })
+		for meme, value in zip(chunk, values):
+			if value is not None:
+				hashes[meme.name] = value
+	await asyncio.gather(*( run(missing[i:i+HASH_CHUNK]) for i in range(0, len(missing), HASH_CHUNK) ))
+	return hashes
+
+def _hash_in_background(client:alemiBot, index:MemeIndex):
+	global _HASHING
+	if _HASHING is not None and not _HASHING.done():
+		return
+	def done(task:asyncio.Task):
+		if not task.cancelled() and task.exception() is not None:
+			logger.error("Could not hash meme collection", exc_info=task.exception())
+	_HASHING = asyncio.ensure_future(photo_hashes(client, index))
+	_HASHING.add_done_callback(done)
+
+def _thumb_path(stem:str) -> str:
+	return os.path.join(MEMES.path, ".thumbs", stem + ".jpg")
+
+def _prune_thumbs():
+	"""drop thumbnails of memes which aren't in collection anymore"""
+	folder = os.path.join(MEMES.path, ".thumbs")
+	if not os.path.isdir(folder):
+		return
+	for fname in os.listdir(folder):
+		meme = MEMES.by_stem(os.path.splitext(fname)[0])
+		if meme is None or meme.kind != "video":
+			os.remove(os.path.join(folder, fname))
+
+async def ingest_meme(client:alemiBot, fpath:str, newname:str) -> str:
+	"""move a downloaded file into meme collection, optimized for sending, and return its final name
+
+	Photos become jpegs within 1280px without metadata, videos bigger than `max_video_mb` under [meme] (default 20) \
+	are transcoded to mp4, smaller ones are only stripped of metadata. Videos get a thumbnail in a hidden `.thumbs` folder, used when uploading them. \
+	Originals are deleted, unless `keep_originals` is set under [meme]: then they're moved in a hidden `.orig` folder.
+	Files which can't be processed (like downloads without extension wrongly named .jpg) are saved as they are.
+	"""
+	folder = MEMES.path
+	stem = os.path.splitext(newname)[0]
+	kind = media_kind(newname)
+	keep = client.config.getboolean("meme", "keep_originals", fallback=False)
+	final, converted = newname, False
+	tmp = os.path.join(folder, f".{stem}.tmp") # hidden, so index won't see it half written
+	_prune_thumbs()
+	try:
+		if kind == "photo":
+			try:
+				converted = await run_in_process(optimize_photo, fpath, tmp, **_pool_opts(client))
+			except OSError as e: # not an image after all, PIL can't open it
+				logger.info("Could not optimize %s (%s), saving it as it is", fpath, e)
+			final = stem + ".jpg" if converted else newname
+		elif kind == "video":
+			os.makedirs(os.path.join(folder, ".thumbs"), exist_ok=True)
+			await video_thumbnail(fpath, _thumb_path(stem))
+			if os.path.getsize(fpath) > client.config.getfloat("meme", "max_video_mb", fallback=20) * 1024 * 1024:
+				converted = await transcode_video(fpath, tmp) and os.path.getsize(tmp) < os.path.getsize(fpath)
+				final = stem + ".mp4" if converted else newname
+			ext = os.path.splitext(newname)[1].lower()
+			if not converted and ext in MUXERS: # not transcoded, at least drop metadata
+				converted = await strip_video(fpath, tmp, MUXERS[ext])
+		if converted:
+			os.replace(tmp, os.path.join(folder, final))
+			if keep:
+				keep_original(fpath, folder, newname)
+			else:
+				os.remove(fpath)
+		else:
+			os.replace(fpath, os.path.join(folder, final))
+	finally:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+	return final
+
+async def send_meme(client:alemiBot, chat_id:int, index:MemeIndex, meme:MemeEntry, **kwargs) -> Message:
+	"""send a file from collection, reusing its file_id if it was uploaded before"""
+	send = getattr(client, SENDERS.get(meme.kind, "send_document"))
+	key = _file_key(index, meme)
+	file_id = _cached_id(key)
+	if file_id is not None:
+		try:
+			return await send(chat_id, file_id, **kwargs)
+		except (BadRequest, ValueError) as e: # expired or otherwise unusable, upload it again
+			logger.info("Cached file_id for %s can't be used (%s), uploading again", meme.name, e)
+	if meme.kind == "video" and index is MEMES and os.path.isfile(_thumb_path(meme.stem)):
+		kwargs["thumb"] = _thumb_path(meme.stem) # otherwise telegram shows a blurry placeholder until it's loaded
+	sent = await send(chat_id, index.path_of(meme), **kwargs)
+	_remember(key, sent)
+	return sent
+
+async def send_meme_group(client:alemiBot, chat_id:int, index:MemeIndex, memes:List[MemeEntry], **kwargs) -> List[Message]:
+	"""send photos from collection as an album, reusing file_ids of those uploaded before"""
+	keys = [ _file_key(index, meme) for meme in memes ]
+	file_ids = [ _cached_id(key) for key in keys ]
+	try:
+		sent = await client.send_media_group(chat_id,
+			[ InputMediaPhoto(file_id or index.path_of(meme)) for meme, file_id in zip(memes, file_ids) ], **kwargs)
+	except (BadRequest, ValueError) as e:
+		if not any(file_ids):
+			raise
+		logger.info("Cached file_ids for album can't be used (%s), uploading again", e)
+		sent = await client.send_media_group(chat_id, [ InputMediaPhoto(index.path_of(meme)) for meme in memes ], **kwargs)
+	for key, msg in zip(keys, sent):
+		_remember(key, msg)
+	return sent
+
 @HELP.add(cmd="[<name>]", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand("meme", options={
 	"batch" : ["-b"]
@@ -34,6 +218,7 @@ INTERRUPT = False
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def meme_cmd(client:alemiBot, message:Message):
 	"""get a meme from collection
 
@@ -42,61 +227,54 @@ async def meme_cmd(client:alemiBot, message:Message):
 	You can send a bunch of random memes together by specifying how many in the `-b` (batch) option \
 	(only photos will be sent if a batch is requested).
 	Memes can be any filetype.
+	Files are uploaded only the first time they're sent, then the telegram file id is reused.
 	"""
 	batchsize = max(min(int(message.command["batch"] or 10), 10), 2)
+	prog = ProgressChatAction(client, message.chat.id, action="upload_document")
 	reply_to = message.id
 	if is_me(message) and message.reply_to_message is not None:
 		reply_to = message.reply_to_message.id
 	if message.command["-stats"]:
-		memenumber = len(os.listdir("plugins/alemibot-tricks/data/meme"))
-		proc_meme = await asyncio.create_subprocess_exec( # ewww this is not cross platform but will do for now
-			"du", "-b", "plugins/alemibot-tricks/data/meme/",
-			stdout=asyncio.subprocess.PIPE,
-			stderr=asyncio.subprocess.STDOUT)
-		stdout, _stderr = await proc_meme.communicate()
-		memesize = float(stdout.decode('utf-8').split("\t")[0])
-		await edit_or_reply(message, f"` → ` **{memenumber}** memes collected\n`  → ` folder size **{order_suffix(memesize)}**")
+		memenumber = len(MEMES)
+		kinds = ", ".join(f"{MEMES.count(kind)} {kind}s" for kind in ("photo", "animation", "video", "audio") if MEMES.count(kind))
+		await edit_or_reply(message, f"` → ` **{memenumber}** memes collected ({kinds})\n`  → ` folder size **{order_suffix(MEMES.total_size)}**")
 	elif message.command["-list"]:
-		memes = os.listdir("plugins/alemibot-tricks/data/meme")
-		memes.sort()
+		memes = MEMES.names()
 		out = f"` → ` **Meme list** ({len(memes)} total) :\n[ "
 		out += ", ".join(memes)
 		out += "]"
 		await edit_or_reply(message, out)
 	elif len(message.command) > 0 and (len(message.command) > 1 or message.command[0] != "-delme"):
 		search = re.compile(message.command[0])
-		found = []
-		for meme in os.listdir("plugins/alemibot-tricks/data/meme"):
-			if search.match(meme):
-				found.append(meme)
+		found = MEMES.search(search)
 		if len(found) > 1:
-			await edit_or_reply(message, "`[!] → ` multiple memes match query\n" + "\n".join(f"`  → ` {meme}" for meme in found))
+			await edit_or_reply(message, "`[!] → ` multiple memes match query\n" + "\n".join(f"`  → ` {meme.name}" for meme in found))
 		elif len(found) == 1:
 			meme = found[0]
-			await send_media(client, message.chat.id, 'plugins/alemibot-tricks/data/meme/' + meme, reply_to_message_id=reply_to,
-					caption=f"` → ` **{meme}**")
+			await send_meme(client, message.chat.id, MEMES, meme, reply_to_message_id=reply_to,
+					caption=f"` → ` **{meme.name}**", progress=prog.tick)
 		elif len(found) < 1:
 			await edit_or_reply(message, f"`[!] → ` no meme matching `{message.command[0]}`")
 	else: 
 		if "batch" in message.command:
 			with ProgressChatAction(client, message.chat.id, action="upload_photo") as prog:
-				pool = [ x for x in filter(lambda x: x.endswith((".jpg", ".jpeg", ".png")), os.listdir("plugins/alemibot-tricks/data/meme")) ]
-				def pick(pool):
-					pick = secrets.choice(pool)
-					pool.remove(pick)
-					return pick
-				memes = [InputMediaPhoto("plugins/alemibot-tricks/data/meme/" + pick(pool)) for _ in range(batchsize)]
-				await client.send_media_group(message.chat.id, memes)
+				memes = MEMES.sample(batchsize, kind="photo")
+				if len(memes) < 2:
+					return await edit_or_reply(message, "`[!] → ` not enough photos in collection")
+				await send_meme_group(client, message.chat.id, MEMES, memes)
 		else:
-			fname = secrets.choice(os.listdir("plugins/alemibot-tricks/data/meme"))
-			await send_media(client, message.chat.id, 'plugins/alemibot-tricks/data/meme/' + fname, reply_to_message_id=reply_to,
-					caption=f"` → ` [--random--] **{fname}**")
+			meme = MEMES.random()
+			if meme is None:
+				return await edit_or_reply(message, "`[!] → ` no memes collected yet")
+			await send_meme(client, message.chat.id, MEMES, meme, reply_to_message_id=reply_to,
+					caption=f"` → ` [--random--] **{meme.name}**", progress=prog.tick)
 
 @HELP.add(cmd="<name>")
-@alemiBot.on_message(sudo & filterCommand("steal", flags=["-pasta"]))
+@alemiBot.on_message(sudo & filterCommand("steal", flags=["-pasta", "-force"]))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def steal_cmd(client:alemiBot, message:Message):
 	"""steal a meme
 
@@ -104,13 +282,17 @@ async def steal_cmd(client:alemiBot, message:Message):
 	Either attach an image or reply to one.
 	A name for the meme must be given (and must not contain spaces)
 	Add flag `-pasta` to save given file (or message text) to copypasta directory
+	Photos too similar to one already collected are refused (see `.dedup`), add flag `-force` to save them anyway. \
+	Memes collected before hashes were introduced are hashed in background and checked once that's done.
+	Photos and big videos are compressed when saved, so that they're quicker to send later.
 	"""
 	is_pasta = message.command["-pasta"]
 	dir_path = "pasta" if is_pasta else "meme"
+	index = PASTAS if is_pasta else MEMES
 	msg = message
 	newname = message.command[0]
 	# check if a file with this name already exists
-	if newname in [ fname.rsplit(".", 1)[0] for fname in os.listdir(f"plugins/alemibot-tricks/data/{dir_path}/") ]:
+	if index.by_stem(newname) is not None:
 		return await edit_or_reply(message, f"`[!] → ` {dir_path} with same name already exists")
 	prog = ProgressChatAction(client, message.chat.id, action="record_video")
 	if len(message.command) < 1:
@@ -127,49 +309,69 @@ async def steal_cmd(client:alemiBot, message:Message):
 		else:
 			extension = "txt" if is_pasta else "jpg" # cmon most memes will be jpg
 		newname = newname + '.' + extension
-		os.rename(fpath, f"plugins/alemibot-tricks/data/{dir_path}/{newname}")
+		value = None
+		if not is_pasta and media_kind(newname) == "photo":
+			try:
+				value = await run_in_process(dhash_file, fpath, timeout=HASH_TIMEOUT,
+												workers=client.config.getint("fry", "workers", fallback=2))
+			except asyncio.TimeoutError:
+				logger.warning("Could not hash %s in time, saving it without duplicate check", fpath)
+			# only compare with hashes already known, missing ones are computed in background for next time
+			hashes, missing = stored_hashes(index)
+			if missing:
+				_hash_in_background(client, index)
+			threshold = client.config.getint("meme", "dedup_threshold", fallback=6)
+			dupes = similar(value, hashes, threshold) if value is not None else []
+			if dupes and not message.command["-force"]:
+				os.remove(fpath)
+				return await edit_or_reply(message, "`[!] → ` looks like a meme already collected\n" +
+					"\n".join(f"`  → ` {name} ({dist} bits off)" for name, dist in dupes[:5]) + "\nAdd `-force` to save it anyway")
+		if is_pasta:
+			os.rename(fpath, f"plugins/alemibot-tricks/data/{dir_path}/{newname}")
+		else:
+			with phase("ingest"):
+				newname = await ingest_meme(client, fpath, newname)
+		meme = index.add(newname)
+		if is_pasta:
+			await PASTA_SEARCH.add(meme)
+		if value is not None:
+			_store_hashes({ _file_key(index, meme) : value })
 		await edit_or_reply(message, f'` → ` saved {dir_path} as {newname}')
 	elif message.command["-pasta"]:
 		with open(f"plugins/alemibot-tricks/data/pasta/{message.command[0]}.txt", "w") as f:
 			f.write(msg.text)
+		await PASTA_SEARCH.add(index.add(f"{message.command[0]}.txt"))
 		await edit_or_reply(message, f'` → ` saved pasta as {message.command[0]}.txt')
 	else:
 		await edit_or_reply(message, "`[!] → ` No input")
 
-#
-# This is from https://github.com/Ovyerus/deeppyer
-#	I should do some license stuff here but TODO
-#
-
-async def fry_image(img: Image) -> Image:
-	colours = ( # TODO tweak values
-		(random.randint(50, 200), random.randint(40, 170), random.randint(40, 190)),
-		(random.randint(190, 255), random.randint(170, 240), random.randint(180, 250))
-	)
-
-	img = img.copy().convert("RGB")
-
-	# Crush image to hell and back
-	img = img.convert("RGB")
-	width, height = img.width, img.height
-	img = img.resize((int(width ** random.uniform(0.8, 0.9)), int(height ** random.uniform(0.8, 0.9))), resample=Image.LANCZOS)
-	img = img.resize((int(width ** random.uniform(0.85, 0.95)), int(height ** random.uniform(0.85, 0.95))), resample=Image.BILINEAR)
-	img = img.resize((int(width ** random.uniform(0.89, 0.98)), int(height ** random.uniform(0.89, 0.98))), resample=Image.BICUBIC)
-	img = img.resize((width, height), resample=Image.BICUBIC)
-	img = ImageOps.posterize(img, random.randint(3, 7))
-
-	# Generate colour overlay
-	overlay = img.split()[0]
-	overlay = ImageEnhance.Contrast(overlay).enhance(random.uniform(1.0, 2.0))
-	overlay = ImageEnhance.Brightness(overlay).enhance(random.uniform(1.0, 2.0))
-
-	overlay = ImageOps.colorize(overlay, colours[0], colours[1])
-
-	# Overlay red and yellow onto main image and sharpen the hell out of it
-	img = Image.blend(img, overlay, random.uniform(0.1, 0.4))
-	img = ImageEnhance.Sharpness(img).enhance(random.randint(5, 300))
-
-	return img
+@HELP.add()
+@alemiBot.on_message(sudo & filterCommand(["dedup", "memedup"], options={
+	"threshold" : ["-t"],
+}))
+@report_error(logger)
+@set_offline
+@cancel_chat_action
+@instrument
+async def dedup_cmd(client:alemiBot, message:Message):
+	"""find duplicate memes
+
+	Hash all photos in meme collection and list groups of near duplicates (resized, recompressed, slightly edited).
+	Images are duplicates if their perceptual hashes differ in at most `-t` bits out of 64 \
+	(default is `dedup_threshold` under [meme], 6).
+	Hashes are computed in background processes and remembered, only new memes are hashed again.
+	Nothing is deleted.
+	"""
+	threshold = int(message.command["threshold"] or client.config.getint("meme", "dedup_threshold", fallback=6))
+	msg = await edit_or_reply(message, f"` → ` Hashing {MEMES.count('photo')} photos...")
+	with phase("compute"):
+		groups = duplicate_groups(await photo_hashes(client, MEMES), threshold)
+	if not groups:
+		return await edit_or_reply(msg, "` → ` No duplicates found")
+	out = f"` → ` **{len(groups)}** groups of duplicates (max {threshold} bits off)\n"
+	for group in groups:
+		out += f"`  → ` {', '.join(group)}\n"
+	await edit_or_reply(msg, out)
 
 @HELP.add(sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand("fry", options={
@@ -178,78 +380,61 @@ async def fry_image(img: Image) -> Image:
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def deepfry_cmd(client:alemiBot, message:Message):
 	"""deepfry an image
 
 	Will deepfry an image (won't add "laser eyes").
-	The number of frying rounds can be specified with `-c`. Will default to 1.
+	The number of frying rounds can be specified with `-c`. Will default to 1, max is 10.
+	Frying happens in background processes: set their number (`workers`, default 2), max rounds (`max_count`) \
+	and how long a job can take (`timeout`, seconds) under [fry] in config.
 	Code from https://github.com/Ovyerus/deeppyer.
 	"""
 	target = message.reply_to_message if message.reply_to_message is not None else message
 	prog = ProgressChatAction(client, message.chat.id, action="upload_photo")
 	if target.media:
 		msg = await edit_or_reply(message, "` → ` Downloading...")
-		count = int(message.command["count"] or 1)
-		fpath = await client.download_media(target, progress=prog.tick)
+		count = max(min(int(message.command["count"] or 1), client.config.getint("fry", "max_count", fallback=10)), 1)
+		with phase("download"):
+			raw = await client.download_media(target, in_memory=True, progress=prog.tick)
 		msg.edit(get_text(message) + "\n` → ` Downloading [OK]\n` → ` Frying...")
-		image = Image.open(fpath)
 
-		for _ in range(count):
+		with phase("compute"):
 			await prog.tick()
-			image = await fry_image(image)
+			try:
+				fried = await run_in_process(fry_bytes, raw.getvalue(), count,
+					timeout=client.config.getfloat("fry", "timeout", fallback=60.0),
+					workers=client.config.getint("fry", "workers", fallback=2))
+			except asyncio.TimeoutError:
+				return await edit_or_reply(message, "`[!] → ` Frying took too long, try with fewer rounds or a smaller image")
 		if message.from_user is not None and message.from_user.is_self:
 			await msg.edit(get_text(message) +
 				"\n` → ` Downloading [OK]\n` → ` Frying [OK]\n` → ` Uploading...")
 
-		fried_io = io.BytesIO()
+		fried_io = io.BytesIO(fried)
 		fried_io.name = "fried.jpg"
-		image.save(fried_io, "JPEG")
-		fried_io.seek(0)
-		await client.send_photo(message.chat.id, fried_io, reply_to_message_id=message.id,
-									caption=f"` → Fried {count} time{'s' if count > 1 else ''}`", progress=prog.tick)
+		with phase("upload"):
+			await client.send_photo(message.chat.id, fried_io, reply_to_message_id=message.id,
+										caption=f"` → Fried {count} time{'s' if count > 1 else ''}`", progress=prog.tick)
 		if message.from_user is not None and message.from_user.is_self:
 			await msg.edit(get_text(message) +
 				"\n` → ` Downloading [OK]\n` → ` Frying [OK]\n` → ` Uploading [OK]")
-		os.remove(fpath)
 	else:
 		await edit_or_reply(message, "`[!] → ` you need to attach or reply to a file, dummy")
 
-#
-#	This comes from https://github.com/anuragrana/Python-Scripts/blob/master/image_to_ascii.py
-#
-
-def ascii_image(img:Image, new_width:int=120) -> str:
-	# resize the image
-	width, height = img.size
-	aspect_ratio = height/width
-	new_height = aspect_ratio * new_width * 0.55
-	img = img.resize((new_width, int(new_height)))
-	img = img.convert('L')
-
-	pixels = img.getdata()
-
-	# replace each pixel with a character from array
-	chars = ["B","S","#","&","@","$","%","*","!",":","."]
-	new_pixels_list = [chars[pixel//25] for pixel in pixels]
-	new_pixels = ''.join(new_pixels_list)
-
-	# split string of chars into multiple strings of length equal to new width and create a list
-	new_pixels_count = len(new_pixels)
-	ascii_image_list = [new_pixels[index:index + new_width] for index in range(0, new_pixels_count, new_width)]
-	ascii_image = "\n".join(ascii_image_list)
-	return ascii_image
-
 @HELP.add(cmd="[<width>]", sudo=False)
-@alemiBot.on_message(is_allowed & filterCommand("ascii"))
+@alemiBot.on_message(is_allowed & filterCommand("ascii", flags=["-ansi", "-html"]))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def ascii_cmd(client:alemiBot, message:Message):
 	"""make ascii art of picture
 
 	Roughly convert a picture into ascii art.
 	You can specify width of the resulting image in characters as command argument (default is 120).
 	If the requested width is lower than 50 characters,	the result will be printed directly into telegram. Else, a txt will be attached.
+	Add flag `-ansi` to get a coloured txt (with terminal colour codes, `cat` it) or `-html` to get a coloured html page.
 	Code comes from https://github.com/anuragrana/Python-Scripts/blob/master/image_to_ascii.py.
 	"""
 	msg = message
@@ -257,19 +442,23 @@ async def ascii_cmd(client:alemiBot, message:Message):
 		msg = message.reply_to_message
 	prog = ProgressChatAction(client, message.chat.id, action="upload_document")
 	width = int(message.command[0] or 120)
+	colour = "html" if message.command["-html"] else "ansi" if message.command["-ansi"] else None
 	if msg.media:
-		fpath = await client.download_media(msg, file_name="toascii")
+		with phase("download"):
+			fpath = await client.download_media(msg, file_name="toascii")
 		image = Image.open(fpath)
 
-		ascii_result = ascii_image(image, new_width=width)
-
-		if width <= 50:
-			await edit_or_reply(message, "``` →\n" + ascii_result + "```")
-		else:
-			out = io.BytesIO(ascii_result.encode('utf-8'))
-			out.name = "ascii.txt"
-			await client.send_document(message.chat.id, out, reply_to_message_id=message.id,
-										caption=f"` → Made ASCII art `", progress=prog.tick)
+		with phase("compute"):
+			ascii_result = ascii_image(image, new_width=width, colour=colour)
+
+		with phase("upload"):
+			if width <= 50 and colour is None:
+				await edit_or_reply(message, "``` →\n" + ascii_result + "```")
+			else:
+				out = io.BytesIO(ascii_result.encode('utf-8'))
+				out.name = "ascii.html" if colour == "html" else "ascii.txt"
+				await client.send_document(message.chat.id, out, reply_to_message_id=message.id,
+											caption=f"` → Made ASCII art `", progress=prog.tick)
 	else:
 		await edit_or_reply(message, "`[!] → ` you need to attach or reply to a file, dummy")
 
@@ -277,18 +466,20 @@ async def ascii_cmd(client:alemiBot, message:Message):
 @alemiBot.on_message(sudo & filterCommand("pasta", options={
 	"separator" : ["-s", "-sep"],
 	"interval" : ["-i", "-intrv"]
-}, flags=["-list", "-stop", "-mono", "-edit"]))
+}, flags=["-list", "-find", "-stop", "-mono", "-edit"]))
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def pasta_cmd(client:alemiBot, message:Message):
 	"""drop a copypasta
 
 	Give copypasta name or path to any file containing long text and bot will drop it in chat.
 	List all saved copypastas with `-list` flag.
+	Search words inside saved copypastas with `-find` flag (like `.pasta -find gnu linux`): best matches are listed, with a snippet.
 	Use flag `-stop` to stop ongoing pasta.
 	A separator can be specified with `-s` to split the copypasta (for example, at newlines `\\n`).
-	Long messages will still be split in chunks of 4096 characters due to telegram limit.
+	Long messages will still be split in chunks of 4096 characters due to telegram limit, at spaces or newlines if possible.
 	Messages will be sent at an interval of 1 second by default. A different interval can be specified with `-i`.
 	Add flag `-mono` to print pasta monospaced.
 	Add flag `-edit` to always edit the first message instead of sending new ones.
@@ -299,10 +490,23 @@ async def pasta_cmd(client:alemiBot, message:Message):
 		return
 	if message.command["-list"]:
 		return await edit_or_reply(message,\
-			"\n".join(f"` → ` {pasta}" for pasta in os.listdir("plugins/alemibot-tricks/data/pasta/"))
+			"\n".join(f"` → ` {pasta}" for pasta in PASTAS.names())
 		)
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` No input")
+	if message.command["-find"]:
+		query = message.command.text
+		with phase("index"):
+			await PASTA_SEARCH.update(PASTAS.get(name) for name in PASTAS.names())
+		with phase("compute"):
+			found = PASTA_SEARCH.search(query)
+			if not found:
+				return await edit_or_reply(message, f"`[!] → ` No pasta contains `{query}`")
+			out = f"` → ` Pastas matching **{query}**\n"
+			for name, score in found:
+				snippet = PASTA_SEARCH.snippet(name, query).translate(MARKDOWN_CHARS)
+				out += f"`  → ` **{name}** ({score:.1f})\n{snippet}\n"
+		return await edit_or_reply(message, out)
 	repl_id = None
 	if message.reply_to_message:
 		repl_id = message.reply_to_message.id
@@ -315,33 +519,25 @@ async def pasta_cmd(client:alemiBot, message:Message):
 	# Find correct path
 	path = message.command[0]
 	try:
-		pattern = re.compile(message.command[0])
-		for pasta in os.listdir("plugins/alemibot-tricks/data/pasta"):
-			if pattern.match(pasta):
-				path = f"plugins/alemibot-tricks/data/pasta/{pasta}"
-				break
+		found = PASTAS.search(re.compile(message.command[0]))
+		if found:
+			path = PASTAS.path_of(found[0])
 	except re.error:
 		pass
-	# load text, make it a list so it's iterable
-	with open(path, "rb") as f:
-		text = [ f.read().decode('utf-8', 'ignore') ]
-	# apply separator if requested
-	if sep:
-		text = re.split(sep, text[0])
-	with ProgressChatAction(client, message.chat.id, action="typing") as prog:
-		for section in text:
-			for chunk in batchify(section, 4096):
-				if len(chunk.strip()) < 1:
-					continue
-				if monospace:
-					chunk = "<code>" + html.escape(chunk) + "</code>"
-				if edit_this:
-					await edit_this.edit(chunk, parse_mode=p_mode)
-				else:
-					await client.send_message(message.chat.id, chunk, parse_mode=p_mode, reply_to_message_id=repl_id)
-				await asyncio.sleep(intrv)
-				if client.ctx.INTERRUPT_PASTA:
-					client.ctx.INTERRUPT_PASTA = False
-					raise Exception("Interrupted by user")
+	# read text lazily, split at separator (if requested) and in chunks which fit in a message
+	with open(path, "rb") as f, ProgressChatAction(client, message.chat.id, action="typing") as prog:
+		for chunk in stream_chunks(f, 4096, sep):
+			if len(chunk.strip()) < 1:
+				continue
+			if monospace:
+				chunk = "<code>" + html.escape(chunk) + "</code>"
+			if edit_this:
+				await edit_this.edit(chunk, parse_mode=p_mode)
+			else:
+				await client.send_message(message.chat.id, chunk, parse_mode=p_mode, reply_to_message_id=repl_id)
+			await asyncio.sleep(intrv)
+			if client.ctx.INTERRUPT_PASTA:
+				client.ctx.INTERRUPT_PASTA = False
+				raise Exception("Interrupted by user")
 		if edit_this:
 			await edit_this.edit("` → ` Done")
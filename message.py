@@ -2,7 +2,6 @@ import asyncio
 import time
 import re
 import os
-import secrets
 import logging
 
 from pyrogram import filters
@@ -18,7 +17,7 @@ from alemibot.util import (
 	filterCommand, parse_timedelta, report_error, set_offline, cancel_chat_action, HelpCategory
 )
 
-from zalgo_text import zalgo
+from .util import instrument, zalgofy, random_case
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +27,7 @@ HELP = HelpCategory("MESSAGE")
 @alemiBot.on_message(~filters.scheduled & filters.me & filters.regex(pattern=
 	r"(?:.*|)(?:-delme)(?: |)(?P<time>[0-9]+|)$"
 ), group=5)
+@instrument
 async def deleteme(client:alemiBot, message:Message):
 	"""immediately delete message
 
@@ -42,18 +42,21 @@ async def deleteme(client:alemiBot, message:Message):
 
 @HELP.add(title="shrug")
 @alemiBot.on_message(filters.me & filters.regex(pattern=r":shrug:"), group=2)
+@instrument
 async def shrug_replace(client:alemiBot, message:Message):
 	"""will replace :shrug: ¯\_(ツ)_/¯ anywhere in message (like tdesktop)"""
 	await message.edit(re.sub(r":shrug:","¯\_(ツ)_/¯", message.text.markdown))
 
 @HELP.add(title="eyy")
 @alemiBot.on_message(filters.me & filters.regex(pattern=r":eyy:"), group=3)
+@instrument
 async def eyy_replace(client:alemiBot, message:Message):
 	"""will replace :eyy: with ( ͡° ͜ʖ ͡°) anywhere in message"""
 	await message.edit(re.sub(r":eyy:","( ͡° ͜ʖ ͡°)", message.text.markdown))
 
 @HELP.add(title="holup")
 @alemiBot.on_message(filters.me & filters.regex(pattern=":holup:"), group=4)
+@instrument
 async def holup_replace(client:alemiBot, message:Message):
 	"""will replace :holup: with (▀̿Ĺ̯▀̿ ̿) anywhere in message"""
 	await message.edit(re.sub(r":holup:","(▀̿Ĺ̯▀̿ ̿)", message.text.markdown))
@@ -64,6 +67,7 @@ async def holup_replace(client:alemiBot, message:Message):
 }, flags=["-nodel"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def merge_cmd(client:alemiBot, message:Message):
 	"""join multiple messages into one
 
@@ -111,6 +115,7 @@ def make_media_group(files):
 @report_error(logger)
 @set_offline
 @cancel_chat_action
+@instrument
 async def album_cmd(client:alemiBot, message:Message): # TODO add uploading_file chat action progress
 	"""join multiple media into one message
 
@@ -170,6 +175,7 @@ async def album_cmd(client:alemiBot, message:Message): # TODO add uploading_file
 		"batch" : ["-b"]
 }))
 @set_offline
+@instrument
 async def slowtype_cmd(client:alemiBot, message:Message):
 	"""make text appear slowly
 
@@ -204,6 +210,7 @@ async def slowtype_cmd(client:alemiBot, message:Message):
 }))
 @report_error(logger)
 @set_offline
+@instrument
 async def zalgo_cmd(client:alemiBot, message:Message):
 	"""h̴͔̣̰̲̣̫̲͉̞͍͖̩͖̭͓̬̼ͫ̈͒̊͟͟͠e̵̙͓̼̻̳̝͍̯͇͕̳̝͂̌͐ͫ̍ͬͨ͑̕ ̷̴̢̛̝̙̼̣̔̎̃ͨ͆̾ͣͦ̑c̵̥̼͖̲͓̖͕̭ͦ̽ͮͮ̇ͭͥ͠o̷̷͔̝̮̩͍͉͚͌̿ͥ̔ͧ̉͛ͭ͊̀͜ͅm̵̸̡̰̭͓̩̥͚͍͎̹͖̠̩͙̯̱͙͈͍͉͂ͩ̄̅͗͞e̢̛͖̪̞̐̒̈̓̒́͒̈́̀ͅṡ̡̢̟͖̩̝̣͙̣͔̑́̓̿̊̑̍̉̓͘͢
 
@@ -218,12 +225,7 @@ async def zalgo_cmd(client:alemiBot, message:Message):
 	noise = int(message.command["noise"] or 1)
 	damage = max(min(float(message.command["damage"] or 0), 1.0), 0.0)
 	max_accents = int(message.command["max"] or 10)
-	z = zalgo.zalgo()
-	z.maxAccentsPerLetter = max_accents
-	z.numAccentsUp = ( 1+ int(damage*noise), 3 * noise )
-	z.numAccentsDown = ( 1+ int(damage*noise), 3 * noise )
-	z.numAccentsMiddle = ( 1+ int(damage*noise), 2 * noise )
-	out = z.zalgofy(text)
+	out = zalgofy(text, noise=noise, damage=damage, max_accents=max_accents)
 
 	first = True # kinda ugly but this is kinda different from edit_or_reply
 	for batch in batchify(out, 4090):
@@ -237,6 +239,7 @@ async def zalgo_cmd(client:alemiBot, message:Message):
 @alemiBot.on_message(is_allowed & filterCommand(["rc", "randomcase"]))
 @report_error(logger)
 @set_offline
+@instrument
 async def randomcase_cmd(client:alemiBot, message:Message):
 	"""make text randomly capialized
 
@@ -244,27 +247,7 @@ async def randomcase_cmd(client:alemiBot, message:Message):
 	"""
 	if len(message.command) < 1:
 		return await edit_or_reply(message, "`[!] → ` No input")
-	text = message.command.text
-	msg = "" # omg this part is done so badly
-	val = 0  # but I want a kinda imbalanced random
-	upper = False
-	for c in text:
-		last = val
-		val = secrets.randbelow(4)
-		if val > 2:
-			msg += c.upper()
-			upper = True
-		elif val < 1:
-			msg += c
-			upper = False
-		else:
-			if upper:
-				msg += c
-				upper = False
-			else:
-				msg += c.upper()
-				upper = True
-	await edit_or_reply(message, msg)
+	await edit_or_reply(message, random_case(message.command.text))
 
 def interval(delta):
 	if delta > 100:
@@ -284,6 +267,7 @@ def interval(delta):
 @HELP.add(cmd="[<seconds>]", sudo=False)
 @alemiBot.on_message(is_allowed & filterCommand(["countdown", "cd"]))
 @set_offline
+@instrument
 async def countdown_cmd(client:alemiBot, message:Message):
 	"""count down
 
@@ -0,0 +1,74 @@
+import io
+import time
+import logging
+
+from alemibot import alemiBot
+
+from alemibot.util.command import _Message as Message
+from alemibot.util import (
+	sudo, edit_or_reply, filterCommand, report_error, set_offline, HelpCategory
+)
+
+from .util import instrument, render_prometheus, reset_stats, started, STATS
+
+logger = logging.getLogger(__name__)
+
+HELP = HelpCategory("PERF")
+
+SORT_KEYS = {
+	"time" : lambda s: s.latency.sum,
+	"calls" : lambda s: s.calls,
+	"errors" : lambda s: s.errors,
+	"avg" : lambda s: s.latency.sum / s.calls if s.calls else 0.0,
+	"p95" : lambda s: s.latency.quantile(0.95),
+}
+
+@HELP.add(cmd="[<command>]")
+@alemiBot.on_message(sudo & filterCommand(["perf", "cmdstats"], options={
+	"sort" : ["-s", "-sort"],
+	"top" : ["-n"],
+}, flags=["-prom", "-reset"]))
+@report_error(logger)
+@set_offline
+@instrument
+async def perf_cmd(client:alemiBot, message:Message):
+	"""show command performance stats
+
+	Show calls, errors and latency (average and 95th percentile) of plugin commands since startup.
+	Commands are sorted by total time spent, sort by something else with `-s` (`time`, `calls`, `errors`, `avg`, `p95`).
+	Only first 15 are shown, change this with `-n`.
+	Give a command handler name (like `.perf weather_cmd`) to see also how time is split among its phases (download, compute, upload...).
+	Add flag `-prom` to get all metrics as a file in Prometheus text format. Metrics can also be served on a port \
+	or periodically written to a file: set `port` (and `host`) or `file` (and `interval`) under [metrics].
+	Add flag `-reset` to start counting again.
+	"""
+	if message.command["-reset"]:
+		reset_stats()
+		return await edit_or_reply(message, "` → ` Cleared command stats")
+	if message.command["-prom"]:
+		out = io.BytesIO(render_prometheus().encode("utf-8"))
+		out.name = "metrics.txt"
+		return await client.send_document(message.chat.id, out, reply_to_message_id=message.id,
+										caption="` → ` Command metrics")
+	if len(message.command) > 0:
+		stats = STATS.get(message.command[0])
+		if stats is None:
+			return await edit_or_reply(message, f"`[!] → ` No command named `{message.command[0]}`")
+		out = f"` → ` **{stats.name}** : {stats.calls} calls, {stats.errors} errors, {stats.running} running\n"
+		if stats.calls:
+			out += f"`  → ` avg **{stats.latency.sum / stats.calls * 1000:.0f}**ms | p95 < {stats.latency.quantile(0.95):g}s\n"
+		for name, hist in stats.phases.items():
+			out += f"`  → ` {name} : avg **{hist.sum / hist.count * 1000:.0f}**ms | p95 < {hist.quantile(0.95):g}s ({hist.count})\n"
+		return await edit_or_reply(message, out)
+	sort = message.command["sort"] or "time"
+	if sort not in SORT_KEYS:
+		return await edit_or_reply(message, f"`[!] → ` Can't sort by `{sort}`")
+	top = int(message.command["top"] or 15)
+	ranked = sorted((s for s in STATS.values() if s.calls), key=SORT_KEYS[sort], reverse=True)
+	uptime = time.time() - started()
+	out = f"` → ` Command stats (last **{uptime / 3600:.1f}**h, by {sort})\n```\n"
+	out += f"{'command':<22}{'calls':>7}{'err':>5}{'avg ms':>9}{'p95 s':>7}\n"
+	for s in ranked[:top]:
+		out += f"{s.name[:21]:<22}{s.calls:>7}{s.errors:>5}{s.latency.sum / s.calls * 1000:>9.0f}{s.latency.quantile(0.95):>7g}\n"
+	out += "```"
+	await edit_or_reply(message, out)
@@ -0,0 +1,17 @@
+from .session import get_session, close_session, throttle
+from .executor import run_blocking, run_in_process, shutdown_executor, TIMEOUTS
+from .cache import TTLCache, SingleFlight
+from .rates import RateTable
+from .wiki import fetch_pages, WIKI_CACHE
+from .store import LookupCache, MISSING, normalize_query
+from .text import split_at_space, split_sentences, pack_text, stream_chunks, tokenize, WORD
+from .units import unit_map, convert_value, convert_batch, parse_values
+from .audio import segment_bounds, split_voice
+from .conversation import ConversationStore, truncate
+from .batcher import MicroBatcher, BatchInfo
+from .metrics import instrument, phase, render_prometheus, reset_stats, started, STATS
+from .memes import MemeIndex, MemeEntry, media_kind
+from .phash import dhash, dhash_file, dhash_files, hamming, similar, duplicate_groups
+from .ingest import optimize_photo, transcode_video, strip_video, video_thumbnail, keep_original, MUXERS
+from .search import TextIndex, count_terms
+from .transforms import fry_image, fry_bytes, ascii_image, zalgofy, random_case, figlet, make_qrcode, roll_dice, pick_choices
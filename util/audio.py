@@ -0,0 +1,44 @@
+import io
+
+from typing import List, Tuple
+
+from pydub import AudioSegment
+from pydub.silence import detect_nonsilent
+import speech_recognition as sr
+
+def segment_bounds(speech:List[Tuple[int, int]], length:int, max_len:int) -> List[Tuple[int, int]]:
+	"""split `length` ms of audio in segments at most `max_len` ms long
+
+	Cuts are placed in the middle of silences between `speech` ranges when possible, \
+	speech longer than `max_len` is cut wherever needed.
+	"""
+	cuts = [ (speech[i][1] + speech[i+1][0]) // 2 for i in range(len(speech) - 1) ]
+	cuts.append(length)
+	bounds = []
+	start = 0
+	while start < length:
+		end = start + max_len
+		fitting = [ c for c in cuts if start < c <= end ]
+		if fitting:
+			end = fitting[-1]
+		end = min(end, length)
+		bounds.append((start, end))
+		start = end
+	return bounds
+
+# plenty for speech recognition, and silence detection has to go through a third of the samples of 48kHz opus
+SAMPLE_RATE = 16000
+
+def split_voice(voice:io.BytesIO, max_len:float = 15.0, min_silence:float = 0.4, fmt:str = "ogg") -> List[sr.AudioData]:
+	"""decode a voice message and split it on silences in chunks of at most `max_len` seconds"""
+	voice.seek(0)
+	audio = AudioSegment.from_file(voice, format=fmt).set_channels(1).set_frame_rate(SAMPLE_RATE)
+	speech = detect_nonsilent(audio, min_silence_len=int(min_silence * 1000),
+								silence_thresh=audio.dBFS - 16, seek_step=10)
+	out = []
+	for start, end in segment_bounds(speech, len(audio), int(max_len * 1000)):
+		if not any(s < end and e > start for s, e in speech):
+			continue # only silence in here, don't waste a request
+		chunk = audio[start:end]
+		out.append(sr.AudioData(chunk.raw_data, chunk.frame_rate, chunk.sample_width))
+	return out
@@ -0,0 +1,64 @@
+import time
+import asyncio
+import logging
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BatchInfo:
+	size : int
+	elapsed : float
+
+class MicroBatcher:
+	"""gather concurrent requests and send them together
+
+	Items submitted within `window` seconds from the first one (or until `max_size` items are pending) are \
+	passed as a list to `send`, which must return a list with one result for each item, in order.
+	If `send` returns anything else (like a single error dict), that same value is given to every caller.
+	If `send` raises, every caller gets the exception.
+	"""
+	def __init__(self, send:Callable[[List[Any]], Awaitable[Any]], window:float = 0.05, max_size:int = 16, name:str = "batch"):
+		self.send = send
+		self.window = window
+		self.max_size = max_size
+		self.name = name
+		self._pending : List[Tuple[Any, asyncio.Future]] = []
+		self._timer : Optional[asyncio.TimerHandle] = None
+
+	async def submit(self, item:Any) -> Tuple[Any, BatchInfo]:
+		loop = asyncio.get_running_loop()
+		fut = loop.create_future()
+		self._pending.append((item, fut))
+		if len(self._pending) >= self.max_size:
+			self._flush()
+		elif self._timer is None:
+			self._timer = loop.call_later(self.window, self._flush)
+		return await fut
+
+	def _flush(self):
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		batch, self._pending = self._pending, []
+		if batch:
+			asyncio.ensure_future(self._run(batch))
+
+	async def _run(self, batch:List[Tuple[Any, asyncio.Future]]):
+		start = time.monotonic()
+		try:
+			results = await self.send([ item for item, _ in batch ])
+		except Exception as e:
+			for _, fut in batch:
+				if not fut.done():
+					fut.set_exception(e)
+			return
+		info = BatchInfo(size=len(batch), elapsed=time.monotonic() - start)
+		logger.debug("%s : sent %d items in %.3fs", self.name, info.size, info.elapsed)
+		if not isinstance(results, list) or len(results) != len(batch):
+			results = [ results ] * len(batch)
+		for (_, fut), res in zip(batch, results):
+			if not fut.done(): # caller may have been cancelled
+				fut.set_result((res, info))
@@ -0,0 +1,80 @@
+import time
+import asyncio
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+class TTLCache:
+	"""LRU cache whose entries also expire after `ttl` seconds
+
+	Least recently used entries are dropped once `maxsize` is reached. A `ttl` of 0 or less never expires entries.
+	"""
+	def __init__(self, maxsize:int = 256, ttl:float = 300.0):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._data : "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self) -> int:
+		return len(self._data)
+
+	def __contains__(self, key:Hashable) -> bool:
+		return self._lookup(key) is not None
+
+	def _lookup(self, key:Hashable) -> Optional[Tuple[float, Any]]:
+		entry = self._data.get(key)
+		if entry is None:
+			return None
+		if entry[0] < time.monotonic():
+			del self._data[key]
+			return None
+		return entry
+
+	def get(self, key:Hashable, default:Any = None) -> Any:
+		entry = self._lookup(key)
+		if entry is None:
+			self.misses += 1
+			return default
+		self.hits += 1
+		self._data.move_to_end(key)
+		return entry[1]
+
+	def set(self, key:Hashable, value:Any, ttl:Optional[float] = None):
+		ttl = self.ttl if ttl is None else ttl
+		expires = time.monotonic() + ttl if ttl > 0 else float("inf")
+		self._data[key] = (expires, value)
+		self._data.move_to_end(key)
+		while len(self._data) > self.maxsize:
+			self._data.popitem(last=False)
+
+	def pop(self, key:Hashable, default:Any = None) -> Any:
+		entry = self._data.pop(key, None)
+		return default if entry is None else entry[1]
+
+	def clear(self):
+		self._data.clear()
+
+class SingleFlight:
+	"""merge concurrent calls with the same key into one
+
+	While a call for a key is running, further calls for the same key wait for its result instead of starting another.
+	A waiter being cancelled won't cancel the shared call.
+	"""
+	def __init__(self):
+		self._calls : Dict[Hashable, asyncio.Future] = {}
+
+	def __len__(self) -> int:
+		return len(self._calls)
+
+	async def do(self, key:Hashable, func:Callable[[], Awaitable[Any]]) -> Any:
+		fut = self._calls.get(key)
+		if fut is None:
+			fut = asyncio.ensure_future(func())
+			self._calls[key] = fut
+			def done(f:asyncio.Future):
+				self._calls.pop(key, None)
+				if not f.cancelled():
+					f.exception() # mark as retrieved, every waiter may be gone
+			fut.add_done_callback(done)
+		return await asyncio.shield(fut)
@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import logging
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Conversation = Dict[str, List[str]] # { "past_user_inputs" : [...], "generated_responses" : [...] }
+
+def _size(conv:Conversation) -> int:
+	return sum(len(t) for t in conv.get("past_user_inputs", [])) + sum(len(t) for t in conv.get("generated_responses", []))
+
+def truncate(conv:Conversation, budget:int) -> Conversation:
+	"""drop oldest exchanges until conversation text fits in `budget` characters"""
+	inputs = list(conv.get("past_user_inputs", []))
+	responses = list(conv.get("generated_responses", []))
+	size = _size(conv)
+	while size > budget and (inputs or responses):
+		if inputs:
+			size -= len(inputs.pop(0))
+		if responses:
+			size -= len(responses.pop(0))
+	return { "past_user_inputs" : inputs, "generated_responses" : responses }
+
+class ConversationStore:
+	"""bounded conversation histories, one per user
+
+	Each history is truncated to `max_chars` characters, users idle for more than `idle_ttl` seconds are \
+	forgotten and least recently active users are evicted when more than `max_users` are stored or when all \
+	histories together exceed `max_total_chars`. If a `path` is given, histories are saved there as json.
+	"""
+	def __init__(self, max_chars:int = 2000, max_users:int = 256, idle_ttl:float = 24 * 3600,
+					max_total_chars:int = 200000, path:Optional[str] = None):
+		self.max_chars = max_chars
+		self.max_users = max_users
+		self.idle_ttl = idle_ttl
+		self.max_total_chars = max_total_chars
+		self.path = path
+		self._data : "OrderedDict[int, Tuple[float, Conversation]]" = OrderedDict()
+		self._total = 0
+		if path and os.path.isfile(path):
+			self._load()
+
+	def __len__(self) -> int:
+		return len(self._data)
+
+	def __contains__(self, uid:int) -> bool:
+		return uid in self._data
+
+	def get(self, uid:int) -> Conversation:
+		self._expire()
+		if uid not in self._data:
+			return {}
+		_, conv = self._data[uid]
+		return { k : list(v) for k, v in conv.items() }
+
+	def set(self, uid:int, conv:Conversation):
+		self.pop(uid, save=False)
+		conv = truncate(conv, self.max_chars)
+		self._data[uid] = (time.time(), conv)
+		self._total += _size(conv)
+		self._expire()
+		while self._data and (len(self._data) > self.max_users or self._total > self.max_total_chars):
+			_, (_, old) = self._data.popitem(last=False)
+			self._total -= _size(old)
+		self._save()
+
+	def pop(self, uid:int, save:bool = True) -> Optional[Conversation]:
+		entry = self._data.pop(uid, None)
+		if entry is None:
+			return None
+		self._total -= _size(entry[1])
+		if save:
+			self._save()
+		return entry[1]
+
+	def _expire(self):
+		limit = time.time() - self.idle_ttl
+		while self._data: # ordered by last activity, oldest first
+			uid, (last, conv) = next(iter(self._data.items()))
+			if last >= limit:
+				break
+			del self._data[uid]
+			self._total -= _size(conv)
+
+	def _load(self):
+		try:
+			with open(self.path) as f:
+				raw = json.load(f)
+			for uid, (last, conv) in sorted(raw.items(), key=lambda x: x[1][0]):
+				self._data[int(uid)] = (last, conv)
+				self._total += _size(conv)
+			self._expire()
+		except (OSError, ValueError):
+			logger.exception("Could not load conversations from %s", self.path)
+
+	def _save(self):
+		if not self.path:
+			return
+		tmp = self.path + ".tmp"
+		with open(tmp, "w") as f:
+			json.dump({ str(uid) : entry for uid, entry in self._data.items() }, f)
+		os.replace(tmp, self.path) # never leave a half written file
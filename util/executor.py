@@ -0,0 +1,126 @@
+import asyncio
+import functools
+import logging
+
+from typing import Dict, Optional, Callable, Any
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 16
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_LIMIT = 4
+
+# max concurrent calls allowed for each library, anything not listed gets DEFAULT_LIMIT
+LIMITS : Dict[str, int] = {
+	"italian_dictionary" : 2,
+	"pydictionary" : 2,
+	"udpy" : 4,
+	"translator" : 4,
+	"google_currency" : 2,
+	"cryptocompare" : 4,
+	"geopy" : 1, # no parallel requests to Nominatim, callers also throttle them to 1 per second
+	"pydub" : 4, # spawns ffmpeg, don't run too many together
+}
+
+# seconds before giving up on a call, anything not listed gets DEFAULT_TIMEOUT
+TIMEOUTS : Dict[str, float] = {
+	"italian_dictionary" : 20.0,
+	"pydictionary" : 20.0,
+	"geopy" : 10.0,
+	"speech_recognition" : 60.0,
+	"pydub" : 60.0, # decoding is slow on long voice messages, callers pass more for those
+}
+
+_POOL : Optional[ThreadPoolExecutor] = None
+_SEMAPHORES : Dict[str, asyncio.Semaphore] = {}
+_PROCESS_POOL : Optional[ProcessPoolExecutor] = None
+_PROCESS_SLOTS : Optional[asyncio.Semaphore] = None
+
+def _get_pool() -> ThreadPoolExecutor:
+	global _POOL
+	if _POOL is None:
+		_POOL = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tricks-blocking")
+	return _POOL
+
+def _get_semaphore(lib:str) -> asyncio.Semaphore:
+	if lib not in _SEMAPHORES:
+		_SEMAPHORES[lib] = asyncio.Semaphore(LIMITS.get(lib, DEFAULT_LIMIT))
+	return _SEMAPHORES[lib]
+
+async def run_blocking(lib:str, func:Callable[..., Any], *args, timeout:Optional[float] = None, **kwargs) -> Any:
+	"""run a blocking call in shared thread pool
+
+	At most `LIMITS[lib]` calls for the same library will run together, others will wait for their turn.
+	Raises `asyncio.TimeoutError` if the call takes longer than `timeout` seconds (waiting for a slot included), \
+	if not given `TIMEOUTS[lib]` is used.
+	The worker thread can't be killed, so a timed out call keeps its thread (and its library slot) \
+	busy until it returns.
+	"""
+	loop = asyncio.get_running_loop()
+	call = functools.partial(func, *args, **kwargs)
+	sem = _get_semaphore(lib)
+	async def guarded():
+		await sem.acquire()
+		try:
+			fut = loop.run_in_executor(_get_pool(), call)
+		except BaseException:
+			sem.release()
+			raise
+		def done(f:asyncio.Future):
+			sem.release()
+			if not f.cancelled() and f.exception() is not None: # mark as retrieved, caller may have timed out
+				logger.debug("Blocking call to %s failed: %s", lib, f.exception())
+		fut.add_done_callback(done)
+		return await asyncio.shield(fut) # slot is released when the thread is done, not when we stop waiting
+	return await asyncio.wait_for(guarded(), timeout if timeout is not None else TIMEOUTS.get(lib, DEFAULT_TIMEOUT))
+
+async def run_in_process(func:Callable[..., Any], *args, timeout:float = 60.0, workers:int = 2) -> Any:
+	"""run a CPU bound call in shared process pool
+
+	`func` and all arguments must be picklable: pass raw bytes rather than objects like PIL images.
+	Pool is created on first use with `workers` processes, later values are ignored.
+	Jobs wait for a free worker here rather than in the pool queue, so `timeout` only counts time spent running.
+	A job can't be stopped once started: on timeout the pool is replaced (jobs already running in it still \
+	complete), and the stuck process will exit when done.
+	"""
+	global _PROCESS_POOL, _PROCESS_SLOTS
+	if _PROCESS_SLOTS is None:
+		_PROCESS_SLOTS = asyncio.Semaphore(workers)
+	slots = _PROCESS_SLOTS
+	await slots.acquire()
+	released = False
+	def release(_f:Optional[asyncio.Future] = None):
+		nonlocal released
+		if not released:
+			released = True
+			slots.release()
+	try:
+		if _PROCESS_POOL is None:
+			_PROCESS_POOL = ProcessPoolExecutor(max_workers=workers)
+		pool = _PROCESS_POOL
+		fut = asyncio.get_running_loop().run_in_executor(pool, functools.partial(func, *args))
+	except BaseException:
+		release()
+		raise
+	fut.add_done_callback(release) # slot is freed when the job is done, even if caller was cancelled
+	try:
+		return await asyncio.wait_for(asyncio.shield(fut), timeout)
+	except asyncio.TimeoutError:
+		fut.add_done_callback(lambda f: f.cancelled() or f.exception()) # nobody will read its result
+		release() # stuck process leaves the pool, its slot goes to the new one
+		if _PROCESS_POOL is pool:
+			logger.warning("Process pool job %s timed out, replacing pool", getattr(func, "__name__", func))
+			_PROCESS_POOL = None
+			pool.shutdown(wait=False)
+		raise
+
+def shutdown_executor():
+	global _POOL, _PROCESS_POOL, _PROCESS_SLOTS
+	if _POOL is not None:
+		_POOL.shutdown(wait=False, cancel_futures=True)
+	if _PROCESS_POOL is not None:
+		_PROCESS_POOL.shutdown(wait=False, cancel_futures=True)
+	_POOL = None
+	_PROCESS_POOL = None
+	_PROCESS_SLOTS = None
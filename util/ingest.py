@@ -0,0 +1,97 @@
+import os
+import shutil
+import asyncio
+import logging
+
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# telegram shows photos at most 1280px wide (2560 only when zoomed), and recompresses them anyway
+PHOTO_MAX_SIDE = 1280
+PHOTO_QUALITY = 87
+THUMB_SIDE = 160
+
+def optimize_photo(src:str, dst:str, thumb:Optional[str] = None, max_side:int = PHOTO_MAX_SIDE,
+					quality:int = PHOTO_QUALITY, thumb_side:int = THUMB_SIDE) -> bool:
+	"""save photo at `src` to `dst` as a jpeg fit for telegram, and a small thumbnail to `thumb` if given
+
+	Orientation from exif is applied, then all metadata is dropped and transparency is flattened on white.
+	Returns False without writing `dst` if `src` is already a plain jpeg within `max_side`: encoding it again \
+	would only lose quality. Meant to run in another process.
+	"""
+	with Image.open(src) as img:
+		plain = img.format == "JPEG" and max(img.size) <= max_side and not any(
+			k in img.info for k in ("exif", "icc_profile", "comment", "xmp")
+		)
+		img = ImageOps.exif_transpose(img)
+		if img.mode not in ("RGB", "L"):
+			img = img.convert("RGBA")
+			flat = Image.new("RGB", img.size, (255, 255, 255))
+			flat.paste(img, mask=img.getchannel("A"))
+			img = flat
+		if thumb:
+			small = img.copy()
+			small.thumbnail((thumb_side, thumb_side))
+			small.save(thumb, "JPEG", quality=80)
+		if plain:
+			return False
+		img.thumbnail((max_side, max_side), resample=Image.LANCZOS)
+		img.save(dst, "JPEG", quality=quality, optimize=True, progressive=True)
+	return True
+
+async def _ffmpeg(*args:str, timeout:float = 600) -> bool:
+	if shutil.which("ffmpeg") is None:
+		logger.warning("ffmpeg not found, can't process videos")
+		return False
+	proc = await asyncio.create_subprocess_exec(
+		"ffmpeg", "-y", "-loglevel", "error", *args,
+		stdout=asyncio.subprocess.DEVNULL,
+		stderr=asyncio.subprocess.PIPE)
+	try:
+		_, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+	except asyncio.TimeoutError:
+		proc.kill()
+		await proc.wait()
+		logger.warning("ffmpeg took more than %.0fs, killed", timeout)
+		return False
+	if proc.returncode != 0:
+		logger.warning("ffmpeg failed : %s", stderr.decode(errors="replace").strip())
+		return False
+	return True
+
+async def transcode_video(src:str, dst:str, max_side:int = PHOTO_MAX_SIDE, crf:int = 28, timeout:float = 600) -> bool:
+	"""re-encode video at `src` as h264/aac mp4 within `max_side`, without metadata, to `dst`"""
+	scale = f"scale='min({max_side},iw)':'min({max_side},ih)':force_original_aspect_ratio=decrease:force_divisible_by=2,setsar=1"
+	return await _ffmpeg(
+		"-i", src, "-vf", scale, "-map_metadata", "-1",
+		"-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf), "-pix_fmt", "yuv420p",
+		"-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", "-f", "mp4", dst,
+		timeout=timeout,
+	)
+
+# ffmpeg muxers for video extensions in collection, output goes to a temporary file so it can't be guessed
+MUXERS = { ".mp4" : "mp4", ".mov" : "mov", ".webm" : "webm", ".mkv" : "matroska" }
+
+async def strip_video(src:str, dst:str, fmt:str, timeout:float = 120) -> bool:
+	"""copy video at `src` to `dst` without metadata, streams are not encoded again so it's quick"""
+	extra = ("-movflags", "+faststart") if fmt in ("mp4", "mov") else ()
+	return await _ffmpeg(
+		"-i", src, "-map", "0:v", "-map", "0:a?", "-map_metadata", "-1", "-c", "copy", *extra, "-f", fmt, dst,
+		timeout=timeout,
+	)
+
+async def video_thumbnail(src:str, thumb:str, thumb_side:int = THUMB_SIDE) -> bool:
+	return await _ffmpeg(
+		"-i", src, "-frames:v", "1",
+		"-vf", f"scale={thumb_side}:{thumb_side}:force_original_aspect_ratio=decrease",
+		"-f", "image2", thumb,
+		timeout=60,
+	)
+
+def keep_original(src:str, folder:str, fname:str):
+	"""move `src` into a hidden `.orig` subfolder of collection `folder`"""
+	os.makedirs(os.path.join(folder, ".orig"), exist_ok=True)
+	os.replace(src, os.path.join(folder, ".orig", fname))
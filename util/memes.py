@@ -0,0 +1,136 @@
+import os
+import re
+import random
+import logging
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+KINDS = {
+	"photo" : (".jpg", ".jpeg", ".png"),
+	"animation" : (".gif",),
+	"video" : (".mp4", ".webm", ".mov", ".mkv"),
+	"audio" : (".mp3", ".ogg", ".oga", ".wav", ".flac", ".m4a"),
+	"text" : (".txt",),
+}
+
+def media_kind(fname:str) -> str:
+	ext = os.path.splitext(fname)[1].lower()
+	for kind, extensions in KINDS.items():
+		if ext in extensions:
+			return kind
+	return "document"
+
+@dataclass
+class MemeEntry:
+	name : str
+	stem : str
+	ext : str
+	size : int
+	mtime : float
+	kind : str
+
+class MemeIndex:
+	"""names, sizes and kinds of all files in a collection folder
+
+	The folder is scanned again only when its mtime changes (a file was added, removed or renamed), so lookups, \
+	random picks and stats don't touch the disk beyond one `stat` call.
+	Hidden files and subfolders are ignored.
+	"""
+	def __init__(self, path:str):
+		self.path = path
+		self.entries : Dict[str, MemeEntry] = {}
+		self.total_size = 0
+		self._mtime : Optional[float] = None
+		self._stems : Dict[str, str] = {}
+		self._names : List[str] = []
+		self._by_kind : Dict[str, List[str]] = {}
+		self._rng = random.SystemRandom()
+
+	def refresh(self, force:bool = False):
+		try:
+			mtime = os.stat(self.path).st_mtime
+		except FileNotFoundError:
+			mtime = None
+		if mtime == self._mtime and not force:
+			return
+		entries = {}
+		if mtime is not None:
+			with os.scandir(self.path) as it:
+				for f in it:
+					if f.name.startswith(".") or not f.is_file():
+						continue
+					entries[f.name] = self._entry(f.name, f.stat())
+		self._mtime = mtime
+		self._rebuild(entries)
+		logger.debug("Indexed %d files in %s", len(entries), self.path)
+
+	def _entry(self, fname:str, st:os.stat_result) -> MemeEntry:
+		stem, ext = os.path.splitext(fname)
+		return MemeEntry(name=fname, stem=stem, ext=ext.lstrip(".").lower(), size=st.st_size, mtime=st.st_mtime, kind=media_kind(fname))
+
+	def _rebuild(self, entries:Dict[str, MemeEntry]):
+		self.entries = entries
+		self.total_size = sum(e.size for e in entries.values())
+		self._names = sorted(entries)
+		self._stems = { e.stem : e.name for e in entries.values() }
+		self._by_kind = {}
+		for name in self._names:
+			self._by_kind.setdefault(entries[name].kind, []).append(name)
+
+	def add(self, fname:str) -> MemeEntry:
+		"""index a file just written in the folder, without rescanning it all"""
+		self.refresh() # catch up with other changes first, so that the new mtime is the only one missing
+		entry = self._entry(fname, os.stat(os.path.join(self.path, fname)))
+		entries = dict(self.entries)
+		entries[fname] = entry
+		self._rebuild(entries)
+		self._mtime = os.stat(self.path).st_mtime
+		return entry
+
+	def __len__(self) -> int:
+		self.refresh()
+		return len(self.entries)
+
+	def __contains__(self, fname:str) -> bool:
+		self.refresh()
+		return fname in self.entries
+
+	def get(self, fname:str) -> Optional[MemeEntry]:
+		self.refresh()
+		return self.entries.get(fname)
+
+	def by_stem(self, stem:str) -> Optional[MemeEntry]:
+		"""file with given name, whatever its extension"""
+		self.refresh()
+		fname = self._stems.get(stem)
+		return self.entries[fname] if fname is not None else None
+
+	def path_of(self, entry:MemeEntry) -> str:
+		return os.path.join(self.path, entry.name)
+
+	def names(self, kind:Optional[str] = None) -> List[str]:
+		"""sorted file names, optionally only of given kind"""
+		self.refresh()
+		return list(self._names if kind is None else self._by_kind.get(kind, []))
+
+	def count(self, kind:str) -> int:
+		self.refresh()
+		return len(self._by_kind.get(kind, []))
+
+	def search(self, pattern:"re.Pattern") -> List[MemeEntry]:
+		self.refresh()
+		return [ self.entries[name] for name in self._names if pattern.match(name) ]
+
+	def random(self, kind:Optional[str] = None) -> Optional[MemeEntry]:
+		self.refresh()
+		pool = self._names if kind is None else self._by_kind.get(kind, [])
+		return self.entries[self._rng.choice(pool)] if pool else None
+
+	def sample(self, k:int, kind:Optional[str] = None) -> List[MemeEntry]:
+		"""up to `k` distinct random files"""
+		self.refresh()
+		pool = self._names if kind is None else self._by_kind.get(kind, [])
+		return [ self.entries[name] for name in self._rng.sample(pool, min(k, len(pool))) ]
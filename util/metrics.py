@@ -0,0 +1,196 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+class Histogram:
+	def __init__(self):
+		self.counts = [0] * len(BUCKETS)
+		self.count = 0
+		self.sum = 0.0
+
+	def observe(self, value:float):
+		self.count += 1
+		self.sum += value
+		for i, bound in enumerate(BUCKETS):
+			if value <= bound:
+				self.counts[i] += 1
+				break
+
+	def quantile(self, q:float) -> float:
+		"""estimate quantile as the upper bound of the bucket it falls in"""
+		if self.count == 0:
+			return 0.0
+		rank = q * self.count
+		seen = 0
+		for bound, n in zip(BUCKETS, self.counts):
+			seen += n
+			if seen >= rank:
+				return bound
+		return BUCKETS[-1]
+
+class CommandStats:
+	def __init__(self, name:str):
+		self.name = name
+		self.calls = 0
+		self.errors = 0
+		self.running = 0
+		self.latency = Histogram()
+		self.phases : Dict[str, Histogram] = {}
+
+	def phase(self, name:str) -> Histogram:
+		if name not in self.phases:
+			self.phases[name] = Histogram()
+		return self.phases[name]
+
+STATS : Dict[str, CommandStats] = {}
+STARTED = time.time()
+_CURRENT : contextvars.ContextVar[Optional[CommandStats]] = contextvars.ContextVar("tricks_current_command", default=None)
+_EXPORTER : Optional[asyncio.Task] = None
+_SERVER : Optional[asyncio.AbstractServer] = None
+
+def get_stats(name:str) -> CommandStats:
+	if name not in STATS:
+		STATS[name] = CommandStats(name)
+	return STATS[name]
+
+def reset_stats():
+	global STARTED
+	for stats in STATS.values(): # handlers keep references to these, zero them in place
+		stats.__init__(stats.name)
+	STARTED = time.time()
+
+def started() -> float:
+	"""when metrics started being collected (or were last reset)"""
+	return STARTED
+
+def instrument(func:Callable) -> Callable:
+	"""record calls, errors and latency of a command handler
+
+	Put it right above the handler definition, below `report_error`, so that errors are seen before being handled.
+	"""
+	stats = get_stats(func.__name__)
+	@functools.wraps(func)
+	async def wrapper(client, *args, **kwargs):
+		if _EXPORTER is None:
+			_start_exporter(getattr(client, "config", None))
+		token = _CURRENT.set(stats)
+		stats.calls += 1
+		stats.running += 1
+		start = time.perf_counter()
+		try:
+			return await func(client, *args, **kwargs)
+		except Exception:
+			stats.errors += 1
+			raise
+		finally:
+			stats.latency.observe(time.perf_counter() - start)
+			stats.running -= 1
+			_CURRENT.reset(token)
+	return wrapper
+
+@contextmanager
+def phase(name:str):
+	"""time a phase (like `download`, `compute`, `upload`) of the running command"""
+	stats = _CURRENT.get()
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		if stats is not None:
+			stats.phase(name).observe(time.perf_counter() - start)
+
+def _histogram_lines(metric:str, labels:str, hist:Histogram) -> List[str]:
+	out = []
+	cumulative = 0
+	for bound, n in zip(BUCKETS, hist.counts):
+		cumulative += n
+		le = "+Inf" if bound == float("inf") else repr(bound)
+		out.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+	out.append(f"{metric}_sum{{{labels}}} {hist.sum:.6f}")
+	out.append(f"{metric}_count{{{labels}}} {hist.count}")
+	return out
+
+def render_prometheus() -> str:
+	"""all command metrics in Prometheus text exposition format"""
+	lines = [
+		"# HELP tricks_command_calls_total Command invocations.",
+		"# TYPE tricks_command_calls_total counter",
+	]
+	lines += [ f'tricks_command_calls_total{{command="{s.name}"}} {s.calls}' for s in STATS.values() ]
+	lines += [
+		"# HELP tricks_command_errors_total Command invocations which raised.",
+		"# TYPE tricks_command_errors_total counter",
+	]
+	lines += [ f'tricks_command_errors_total{{command="{s.name}"}} {s.errors}' for s in STATS.values() ]
+	lines += [
+		"# HELP tricks_command_running Commands currently running.",
+		"# TYPE tricks_command_running gauge",
+	]
+	lines += [ f'tricks_command_running{{command="{s.name}"}} {s.running}' for s in STATS.values() ]
+	lines += [
+		"# HELP tricks_command_seconds Command latency.",
+		"# TYPE tricks_command_seconds histogram",
+	]
+	for s in STATS.values():
+		lines += _histogram_lines("tricks_command_seconds", f'command="{s.name}"', s.latency)
+	lines += [
+		"# HELP tricks_command_phase_seconds Time spent in each command phase.",
+		"# TYPE tricks_command_phase_seconds histogram",
+	]
+	for s in STATS.values():
+		for name, hist in s.phases.items():
+			lines += _histogram_lines("tricks_command_phase_seconds", f'command="{s.name}",phase="{name}"', hist)
+	return "\n".join(lines) + "\n"
+
+async def _write_file(path:str, interval:float):
+	while True:
+		await asyncio.sleep(interval)
+		try:
+			tmp = path + ".tmp"
+			with open(tmp, "w") as f:
+				f.write(render_prometheus())
+			os.replace(tmp, path) # scrapers never see half a file
+		except OSError:
+			logger.exception("Could not write metrics to %s", path)
+
+async def _serve(reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+	try:
+		await reader.readuntil(b"\r\n\r\n") # we only serve metrics, whatever the request is
+		body = render_prometheus().encode()
+		writer.write(
+			b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n" +
+			f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+		)
+		await writer.drain()
+	except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+		pass
+	finally:
+		writer.close()
+
+async def _export(config):
+	global _SERVER
+	port = config.getint("metrics", "port", fallback=0) if config is not None else 0
+	path = config.get("metrics", "file", fallback="") if config is not None else ""
+	if port:
+		host = config.get("metrics", "host", fallback="127.0.0.1")
+		try:
+			_SERVER = await asyncio.start_server(_serve, host, port)
+			logger.info("Serving command metrics on %s:%d", host, port)
+		except OSError:
+			logger.exception("Could not serve metrics on %s:%d", host, port)
+	if path:
+		await _write_file(path, config.getfloat("metrics", "interval", fallback=15.0))
+
+def _start_exporter(config):
+	global _EXPORTER
+	_EXPORTER = asyncio.get_running_loop().create_task(_export(config))
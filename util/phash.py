@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from PIL import Image
+
+# dHash: shrink to 9x8 grayscale and compare each pixel with its right neighbour, 64 bits which barely change
+# when an image is resized, recompressed or slightly recoloured. Distance between hashes is counted in different bits.
+
+def dhash(img:Image, size:int = 8) -> int:
+	img = img.convert("L").resize((size + 1, size), resample=Image.BILINEAR)
+	px = np.asarray(img, dtype=np.int16)
+	bits = (px[:, 1:] > px[:, :-1]).flatten()
+	return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def dhash_file(path:str) -> Optional[int]:
+	"""dhash of an image file, None if it can't be read (meant to run in another process)"""
+	try:
+		with Image.open(path) as img:
+			img.draft("L", (64, 64)) # no need to decode a big jpeg at full size for a 9x8 thumbnail
+			return dhash(img)
+	except (OSError, ValueError, Image.DecompressionBombError):
+		return None
+
+def dhash_files(paths:Sequence[str]) -> List[Optional[int]]:
+	return [ dhash_file(p) for p in paths ]
+
+def hamming(a:int, b:int) -> int:
+	return bin(a ^ b).count("1")
+
+def _distances(value:int, others:np.ndarray) -> np.ndarray:
+	xored = np.bitwise_xor(others, np.uint64(value))
+	return np.unpackbits(xored.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def similar(value:int, hashes:Dict[str, int], threshold:int) -> List[Tuple[str, int]]:
+	"""names with hash within `threshold` different bits from `value`, closest first"""
+	if not hashes:
+		return []
+	names = list(hashes)
+	dist = _distances(value, np.array([ hashes[n] for n in names ], dtype=np.uint64))
+	return sorted(((names[i], int(dist[i])) for i in np.flatnonzero(dist <= threshold)), key=lambda x: x[1])
+
+def duplicate_groups(hashes:Dict[str, int], threshold:int) -> List[List[str]]:
+	"""group names whose hashes are within `threshold` bits, directly or through other members"""
+	names = list(hashes)
+	values = np.array([ hashes[n] for n in names ], dtype=np.uint64)
+	parent = list(range(len(names)))
+	def root(i:int) -> int:
+		while parent[i] != i:
+			parent[i] = parent[parent[i]]
+			i = parent[i]
+		return i
+	for i in range(len(names) - 1):
+		for j in np.flatnonzero(_distances(int(values[i]), values[i + 1:]) <= threshold):
+			parent[root(i + 1 + int(j))] = root(i)
+	groups : Dict[int, List[str]] = {}
+	for i, name in enumerate(names):
+		groups.setdefault(root(i), []).append(name)
+	return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=len, reverse=True)
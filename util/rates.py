@@ -0,0 +1,38 @@
+import time
+
+from typing import Dict, Tuple, Optional
+
+class RateTable:
+	"""exchange rates cached per base ticker
+
+	Rates are stored as `table[base][target] = (rate, timestamp)` and considered valid for `ttl` seconds.
+	When a pair is missing, the inverse pair is used if it's still fresh.
+	"""
+	def __init__(self, ttl:float = 300.0):
+		self.ttl = ttl
+		self._table : Dict[str, Dict[str, Tuple[float, float]]] = {}
+
+	def _fresh(self, base:str, target:str) -> Optional[float]:
+		entry = self._table.get(base, {}).get(target)
+		if entry is None:
+			return None
+		rate, ts = entry
+		if time.time() - ts > self.ttl:
+			del self._table[base][target]
+			return None
+		return rate
+
+	def get(self, base:str, target:str) -> Optional[float]:
+		base, target = base.upper(), target.upper()
+		if base == target:
+			return 1.0
+		rate = self._fresh(base, target)
+		if rate is not None:
+			return rate
+		inverse = self._fresh(target, base)
+		if inverse: # also skips 0, can't invert it
+			return 1.0 / inverse
+		return None
+
+	def put(self, base:str, target:str, rate:float):
+		self._table.setdefault(base.upper(), {})[target.upper()] = (rate, time.time())
@@ -0,0 +1,151 @@
+import os
+import asyncio
+import math
+import json
+import logging
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .executor import run_blocking
+from .memes import MemeEntry
+from .text import WORD, stream_chunks, tokenize
+
+logger = logging.getLogger(__name__)
+
+def count_terms(path:str) -> Optional[Counter]:
+	"""how many times each word appears in a text file, None if it looks binary"""
+	counts : Counter = Counter()
+	with open(path, "rb") as f:
+		if b"\0" in f.read(4096):
+			return None
+		f.seek(0)
+		for chunk in stream_chunks(f, 1 << 16):
+			counts.update(tokenize(chunk))
+	return counts
+
+class TextIndex:
+	"""inverted index over text files of a collection, ranking matches with BM25
+
+	Only term counts are kept: files are read again just to build snippets. A file is indexed again when its \
+	size or mtime change. If a `path` is given, the index is saved there as json (in a thread) and loaded at startup.
+	"""
+	def __init__(self, folder:str, path:Optional[str] = None, k1:float = 1.5, b:float = 0.75):
+		self.folder = folder
+		self.path = path
+		self.k1 = k1
+		self.b = b
+		self.docs : Dict[str, Tuple[int, float, int]] = {} # name -> size, mtime, number of words
+		self.postings : Dict[str, Dict[str, int]] = {} # word -> { name -> count }
+		self.terms : Dict[str, List[str]] = {} # name -> words in it, so removing a file only touches its postings
+		self._total_len = 0
+		self._lock : Optional[asyncio.Lock] = None # changes wait for the index to be saved, it's read in a thread
+		if path and os.path.isfile(path):
+			self._load()
+
+	def __len__(self) -> int:
+		return len(self.docs)
+
+	@property
+	def lock(self) -> asyncio.Lock:
+		if self._lock is None:
+			self._lock = asyncio.Lock()
+		return self._lock
+
+	async def update(self, entries:Iterable[MemeEntry]):
+		"""index new and changed files, forget removed ones"""
+		entries = list(entries)
+		async with self.lock:
+			changed = False
+			for name in set(self.docs) - { e.name for e in entries }:
+				self._remove(name)
+				changed = True
+			for entry in entries:
+				if self.docs.get(entry.name, (None, None))[:2] != (entry.size, entry.mtime):
+					await self._index(entry)
+					changed = True
+			if changed:
+				await self._save()
+
+	async def add(self, entry:MemeEntry):
+		async with self.lock:
+			await self._index(entry)
+			await self._save()
+
+	async def _index(self, entry:MemeEntry):
+		# counting happens in a thread, index is only touched here on the event loop
+		counts = await run_blocking("text_index", count_terms, os.path.join(self.folder, entry.name), timeout=300)
+		self._remove(entry.name)
+		if counts is None:
+			counts = Counter()
+		for term, n in counts.items():
+			self.postings.setdefault(term, {})[entry.name] = n
+		self.terms[entry.name] = list(counts)
+		length = sum(counts.values())
+		self.docs[entry.name] = (entry.size, entry.mtime, length)
+		self._total_len += length
+
+	def _remove(self, name:str):
+		if name not in self.docs:
+			return
+		self._total_len -= self.docs.pop(name)[2]
+		for term in self.terms.pop(name, []):
+			docs = self.postings.get(term, {})
+			docs.pop(name, None)
+			if not docs:
+				self.postings.pop(term, None)
+
+	def search(self, query:str, limit:int = 5) -> List[Tuple[str, float]]:
+		"""best matching file names for query, with their score"""
+		if not self.docs:
+			return []
+		avg_len = self._total_len / len(self.docs) or 1.0
+		scores : Counter = Counter()
+		for term in set(tokenize(query)):
+			docs = self.postings.get(term)
+			if not docs:
+				continue
+			idf = math.log((len(self.docs) - len(docs) + 0.5) / (len(docs) + 0.5) + 1.0)
+			for name, tf in docs.items():
+				norm = self.k1 * (1.0 - self.b + self.b * self.docs[name][2] / avg_len)
+				scores[name] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+		return scores.most_common(limit)
+
+	def snippet(self, name:str, query:str, width:int = 160) -> str:
+		"""text around first occurrence of a query word in file"""
+		terms : Set[str] = set(tokenize(query))
+		with open(os.path.join(self.folder, name), "rb") as f:
+			for chunk in stream_chunks(f, 4096):
+				for match in WORD.finditer(chunk):
+					if match.group().casefold() in terms:
+						start = max(match.start() - width // 3, 0)
+						text = " ".join(chunk[start:start + width].split())
+						return ("…" if start > 0 else "") + text + "…"
+		return ""
+
+	def _load(self):
+		try:
+			with open(self.path) as f:
+				raw = json.load(f)
+			self.docs = { name : tuple(doc) for name, doc in raw["docs"].items() }
+			self.postings = raw["postings"]
+			self._total_len = sum(doc[2] for doc in self.docs.values())
+		except (OSError, ValueError, KeyError):
+			logger.exception("Could not load text index from %s", self.path)
+			self.docs, self.postings, self._total_len = {}, {}, 0
+		self.terms = { name : [] for name in self.docs }
+		for term, docs in self.postings.items():
+			for name in docs:
+				self.terms.setdefault(name, []).append(term)
+
+	def _write(self):
+		if os.path.dirname(self.path):
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		tmp = self.path + ".tmp"
+		with open(tmp, "w") as f:
+			json.dump({ "docs" : self.docs, "postings" : self.postings }, f)
+		os.replace(tmp, self.path) # never leave a half written file
+
+	async def _save(self): # callers hold the lock, so nothing changes while the thread reads the index
+		if self.path:
+			await run_blocking("text_index", self._write, timeout=300)
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+from typing import Dict, Optional
+from configparser import ConfigParser
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+_SESSION : Optional[aiohttp.ClientSession] = None
+_LOCK : Optional[asyncio.Lock] = None
+_NEXT_SLOT : Dict[str, float] = {}
+
+def _make_session(config:Optional[ConfigParser] = None) -> aiohttp.ClientSession:
+	def opt(key:str, fallback:float) -> float:
+		if config is None:
+			return fallback
+		return config.getfloat("http", key, fallback=fallback)
+	connector = aiohttp.TCPConnector(
+		limit=int(opt("limit", 100)),
+		limit_per_host=int(opt("limit_per_host", 10)),
+		keepalive_timeout=opt("keepalive", 30.0),
+		ttl_dns_cache=int(opt("dns_ttl", 300)),
+	)
+	timeout = aiohttp.ClientTimeout(
+		total=opt("timeout", 60.0),
+		connect=opt("connect_timeout", 10.0),
+	)
+	return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+async def get_session(config:Optional[ConfigParser] = None) -> aiohttp.ClientSession:
+	"""get the shared plugin session
+
+	Session is created on first use, reading limits and timeouts from the [http] section of \
+	given config (`limit`, `limit_per_host`, `keepalive`, `dns_ttl`, `timeout`, `connect_timeout`).
+	Connections are kept alive and reused across commands. Don't close the returned session, use `close_session()`.
+	"""
+	global _SESSION, _LOCK
+	if _SESSION is not None and not _SESSION.closed:
+		return _SESSION
+	if _LOCK is None:
+		_LOCK = asyncio.Lock()
+	async with _LOCK:
+		if _SESSION is None or _SESSION.closed:
+			_SESSION = _make_session(config)
+			logger.debug("Created shared HTTP session")
+	return _SESSION
+
+async def close_session():
+	"""close shared session, a new one will be created on next `get_session()`
+
+	Must be awaited while the event loop is still running: once it's closed, connections can't be shut down \
+	cleanly anymore (process exit will drop them anyway).
+	"""
+	global _SESSION
+	if _SESSION is not None and not _SESSION.closed:
+		await _SESSION.close()
+		await asyncio.sleep(0.25) # let SSL transports shut down, see aiohttp docs on graceful shutdown
+	_SESSION = None
+
+async def throttle(host:str, per_second:float):
+	"""wait until a request to `host` is allowed, spacing requests at most `per_second` per second"""
+	if per_second <= 0:
+		return
+	now = asyncio.get_running_loop().time()
+	slot = max(now, _NEXT_SLOT.get(host, 0.0))
+	_NEXT_SLOT[host] = slot + 1.0 / per_second # reserve slot before sleeping so waiters queue up
+	if slot > now:
+		await asyncio.sleep(slot - now)
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+from typing import Any, Dict, Optional
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+MISSING = object() # returned by lookups not in cache, since None is a valid (negative) cached value
+
+def normalize_query(query:str) -> str:
+	return " ".join(query.casefold().split())
+
+class LookupCache:
+	"""persistent cache for remote lookups, backed by SQLite
+
+	Values are stored as json under (backend, normalized query). A value of None records a lookup which \
+	found nothing ("negative" entry) and expires after `negative_ttl` instead of `ttl` seconds.
+	Once more than `max_entries` rows are stored, least recently read ones are dropped.
+	Most recent lookups are also kept in memory, so hot queries don't touch the disk.
+	Pass `exact=True` to use the query as given, for case sensitive keys (like telegram file ids).
+	"""
+	def __init__(self, path:str, max_entries:int = 20000, ttl:float = 30 * 24 * 3600,
+					negative_ttl:float = 24 * 3600, memory_size:int = 512):
+		self.path = path
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.negative_ttl = negative_ttl
+		self.memory = TTLCache(maxsize=memory_size, ttl=ttl)
+		self._db : Optional[sqlite3.Connection] = None
+
+	@property
+	def db(self) -> sqlite3.Connection:
+		if self._db is None:
+			if os.path.dirname(self.path):
+				os.makedirs(os.path.dirname(self.path), exist_ok=True)
+			self._db = sqlite3.connect(self.path)
+			self._db.execute(
+				"CREATE TABLE IF NOT EXISTS lookup (" +
+					"backend TEXT NOT NULL, query TEXT NOT NULL, value TEXT, " +
+					"stored REAL NOT NULL, accessed REAL NOT NULL, " +
+					"PRIMARY KEY (backend, query))"
+			)
+			self._db.execute("CREATE INDEX IF NOT EXISTS lookup_accessed ON lookup (accessed)")
+			self._db.commit()
+		return self._db
+
+	def get(self, backend:str, query:str, exact:bool = False) -> Any:
+		key = (backend, query if exact else normalize_query(query))
+		value = self.memory.get(key, MISSING)
+		if value is not MISSING:
+			return value
+		row = self.db.execute("SELECT value, stored FROM lookup WHERE backend = ? AND query = ?", key).fetchone()
+		if row is None:
+			return MISSING
+		value = None if row[0] is None else json.loads(row[0])
+		age = time.time() - row[1]
+		if age > (self.ttl if value is not None else self.negative_ttl):
+			return MISSING
+		self.db.execute("UPDATE lookup SET accessed = ? WHERE backend = ? AND query = ?", (time.time(), *key))
+		self.db.commit()
+		self.memory.set(key, value, ttl=(self.ttl if value is not None else self.negative_ttl) - age)
+		return value
+
+	def set(self, backend:str, query:str, value:Any, exact:bool = False):
+		key = (backend, query if exact else normalize_query(query))
+		now = time.time()
+		self.db.execute(
+			"INSERT OR REPLACE INTO lookup (backend, query, value, stored, accessed) VALUES (?, ?, ?, ?, ?)",
+			(*key, None if value is None else json.dumps(value), now, now)
+		)
+		self.memory.set(key, value, ttl=self.ttl if value is not None else self.negative_ttl)
+		self._evict()
+		self.db.commit()
+
+	def set_many(self, backend:str, values:Dict[str, Any], exact:bool = False):
+		"""store many values for `backend` at once, committing only once"""
+		now = time.time()
+		rows = [ (backend, query if exact else normalize_query(query), None if value is None else json.dumps(value), now, now)
+					for query, value in values.items() ]
+		self.db.executemany(
+			"INSERT OR REPLACE INTO lookup (backend, query, value, stored, accessed) VALUES (?, ?, ?, ?, ?)", rows
+		)
+		for row in rows:
+			self.memory.pop(row[:2]) # `get` will read it back from disk if needed
+		self._evict()
+		self.db.commit()
+
+	def load(self, backend:str) -> Dict[str, Any]:
+		"""every value still valid for `backend`, by query, read with a single query
+
+		Meant to mirror a whole backend in memory: rows read this way don't count as accessed for eviction.
+		"""
+		now = time.time()
+		rows = self.db.execute(
+			"SELECT query, value FROM lookup WHERE backend = ? AND stored > " +
+				"(CASE WHEN value IS NULL THEN ? ELSE ? END)",
+			(backend, now - self.negative_ttl, now - self.ttl)
+		).fetchall()
+		return { query : None if value is None else json.loads(value) for query, value in rows }
+
+	def _evict(self):
+		count = self.db.execute("SELECT COUNT(*) FROM lookup").fetchone()[0]
+		if count <= self.max_entries:
+			return
+		drop = count - int(self.max_entries * 0.9) # free some room so we don't evict on every insert
+		self.db.execute(
+			"DELETE FROM lookup WHERE rowid IN (SELECT rowid FROM lookup ORDER BY accessed ASC LIMIT ?)", (drop,)
+		)
+		self.memory.clear() # may still hold evicted entries, it's cheap to refill
+		logger.debug("Evicted %d entries from lookup cache", drop)
+
+	def close(self):
+		if self._db is not None:
+			self._db.close()
+			self._db = None
@@ -0,0 +1,86 @@
+import re
+import codecs
+
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\s*\n\s*") # whitespace after a sentence, or around a line break
+SPACES = re.compile(r"\s*")
+WORD = re.compile(r"[^\W_]+") # letters and digits of any script, so accented words stay whole
+
+def tokenize(text:str) -> Iterator[str]:
+	"""words in text, casefolded"""
+	for match in WORD.finditer(text):
+		yield match.group().casefold()
+
+def _cut(text:str, size:int) -> int:
+	cut = max(text.rfind("\n", 0, size), text.rfind(" ", 0, size))
+	return cut if cut > 0 else size # no whitespace, break mid-word
+
+def split_at_space(text:str, size:int) -> Iterator[str]:
+	"""split text in pieces of at most `size` characters, breaking at whitespace when possible"""
+	while len(text) > size:
+		cut = _cut(text, size)
+		yield text[:cut]
+		text = text[cut:].lstrip(" ")
+	if text:
+		yield text
+
+def split_sentences(text:str, size:int) -> List[Tuple[str, str]]:
+	"""split text in as few pieces as possible, at most `size` characters long, each with the whitespace following it
+
+	Text is cut only where a piece would get too long: at the last sentence end or line break which fits, \
+	else at the last whitespace (or mid-word if there's none). Pieces joined with their separators give back \
+	the text, layout included (leading and trailing whitespace aside).
+	"""
+	out : List[Tuple[str, str]] = []
+	text = text.rstrip()
+	start = SPACES.match(text).end()
+	while len(text) - start > size:
+		window = text[start:start + size + 1] # whitespace right after the limit is a fine place to cut too
+		ends = [ m.start() for m in SENTENCE_END.finditer(window) if m.start() > 0 ]
+		cut = ends[-1] if ends else max(window.rfind(" "), window.rfind("\n"))
+		if cut <= 0: # no whitespace, break mid-word
+			cut = size
+		end = SPACES.match(text, start + cut).end()
+		out.append((text[start:start + cut], text[start + cut:end]))
+		start = end
+	if start < len(text):
+		out.append((text[start:], ""))
+	return out
+
+def pack_text(units:Iterable[str], size:int, joiner:str = "\n") -> List[Tuple[str, str]]:
+	"""join text units with `joiner`, then split them in payloads at most `size` characters long
+
+	Returns (payload, separator) pairs like `split_sentences`, so that results can be joined back with the same layout.
+	"""
+	return split_sentences(joiner.join(unit for unit in units if unit), size)
+
+def stream_chunks(fp:BinaryIO, size:int = 4096, separator:Optional[str] = None,
+					block:int = 1 << 16, encoding:str = "utf-8") -> Iterator[str]:
+	"""read text from binary file `fp` one block at a time, yield pieces of at most `size` characters
+
+	Pieces break at whitespace when possible and never go across a match of `separator` (a regex), which is dropped.
+	Memory used depends on `size` and `block`, not on file size. Bytes which can't be decoded are skipped.
+	"""
+	decoder = codecs.getincrementaldecoder(encoding)("ignore")
+	pattern = re.compile(separator) if separator else None
+	buf = ""
+	while True:
+		data = fp.read(block)
+		final = not data
+		buf += decoder.decode(data, final=final)
+		if pattern is not None:
+			start = 0
+			for match in pattern.finditer(buf):
+				if match.end() == len(buf) and not final:
+					break # separator may go on in next block
+				yield from split_at_space(buf[start:match.start()], size)
+				start = match.end()
+			buf = buf[start:]
+		if final:
+			yield from split_at_space(buf, size)
+			return
+		while len(buf) > 2 * size: # keep some text back, a separator may start near the end
+			cut = _cut(buf, size)
+			yield buf[:cut]
+			buf = buf[cut:].lstrip(" ")
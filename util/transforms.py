@@ -0,0 +1,191 @@
+import io
+import html
+import random
+import secrets
+
+from collections import Counter
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from PIL import Image, ImageEnhance, ImageOps, ImageStat
+import qrcode
+import pyfiglet
+from zalgo_text import zalgo
+
+# These are the CPU bound parts of some commands, kept apart from telegram stuff so that they can be benchmarked
+
+#
+# This is from https://github.com/Ovyerus/deeppyer
+#	I should do some license stuff here but TODO
+#
+
+FRY_MAX_SIDE = 1280 # photos are sent compressed anyway, there's no point frying more pixels than telegram keeps
+
+def _overlay_palette(mean:int, contrast:float, brightness:float, colours:np.ndarray) -> bytes:
+	"""contrast, brightness and colorize of the red band, fused into one 256 colours palette
+
+	Rounding follows PIL (truncating enhance, integer colorize), sharpening would amplify any difference.
+	"""
+	level = np.arange(256, dtype=np.float32)
+	level = np.clip(np.trunc(mean + (level - mean) * np.float32(contrast)), 0, 255)
+	level = np.clip(np.trunc(level * np.float32(brightness)), 0, 255).astype(np.int32)
+	palette = colours[0] + np.outer(level, colours[1] - colours[0]) // 255
+	palette[level == 255] = colours[1]
+	return palette.astype(np.uint8).tobytes()
+
+def _fry_round(img:Image) -> Image:
+	colours = np.array(( # TODO tweak values
+		(random.randint(50, 200), random.randint(40, 170), random.randint(40, 190)),
+		(random.randint(190, 255), random.randint(170, 240), random.randint(180, 250))
+	), dtype=np.int32)
+
+	# Crush image to hell and back
+	width, height = img.width, img.height
+	img = img.resize((int(width ** random.uniform(0.8, 0.9)), int(height ** random.uniform(0.8, 0.9))), resample=Image.LANCZOS)
+	img = img.resize((int(width ** random.uniform(0.85, 0.95)), int(height ** random.uniform(0.85, 0.95))), resample=Image.BILINEAR)
+	img = img.resize((int(width ** random.uniform(0.89, 0.98)), int(height ** random.uniform(0.89, 0.98))), resample=Image.BICUBIC)
+	img = img.resize((width, height), resample=Image.BICUBIC)
+	img = ImageOps.posterize(img, random.randint(3, 7))
+
+	# Generate colour overlay: the whole chain only depends on red value, so it's applied as a palette in one pass
+	overlay = img.getchannel(0)
+	mean = int(ImageStat.Stat(overlay).mean[0] + 0.5)
+	overlay.putpalette(_overlay_palette(mean, random.uniform(1.0, 2.0), random.uniform(1.0, 2.0), colours))
+	overlay = overlay.convert("RGB")
+
+	# Overlay red and yellow onto main image and sharpen the hell out of it
+	img = Image.blend(img, overlay, random.uniform(0.1, 0.4))
+	img = ImageEnhance.Sharpness(img).enhance(random.randint(5, 300))
+
+	return img
+
+def fry_image(img:Image, count:int = 1) -> Image:
+	img = img.convert("RGB")
+	for _ in range(count):
+		img = _fry_round(img)
+	return img
+
+def fry_bytes(data:bytes, count:int = 1, max_side:int = FRY_MAX_SIDE) -> bytes:
+	"""fry an encoded image `count` times, return it as jpeg (meant to run in another process)
+
+	Big jpegs are decoded directly at a reduced scale (1/2, 1/4 or 1/8, never below `max_side`), which is much \
+	cheaper than decoding at full size and resizing later.
+	"""
+	image = Image.open(io.BytesIO(data))
+	if image.format == "JPEG":
+		image.draft("RGB", (max_side, max_side))
+	image = fry_image(image, count)
+	out = io.BytesIO()
+	image.save(out, "JPEG")
+	return out.getvalue()
+
+#
+#	This comes from https://github.com/anuragrana/Python-Scripts/blob/master/image_to_ascii.py
+#
+
+ASCII_CHARS = "BS#&@$%*!:."
+_ASCII_LUT = np.frombuffer(ASCII_CHARS.encode("ascii"), dtype=np.uint8)[np.arange(256) // 25]
+
+# colour modes use the xterm 256 colours cube (6 levels per channel), so that near pixels share a colour tag
+_CUBE_LEVELS = np.array((0, 95, 135, 175, 215, 255))
+_CUBE_INDEX = np.abs(np.arange(256)[:, None] - _CUBE_LEVELS).argmin(axis=1).astype(np.int16)
+_CUBE_HEX = [ f"{_CUBE_LEVELS[i // 36]:02x}{_CUBE_LEVELS[i // 6 % 6]:02x}{_CUBE_LEVELS[i % 6]:02x}" for i in range(216) ]
+
+HTML_HEAD = '<html><head><meta charset="utf-8"></head><body style="background:#000"><pre style="line-height:1">'
+HTML_TAIL = "</pre></body></html>"
+
+def ascii_rows(img:Image, new_width:int = 120, colour:Optional[str] = None) -> Iterator[str]:
+	"""yield rows of ascii art, plain or coloured (`colour` is "ansi" or "html")"""
+	# resize the image
+	width, height = img.size
+	aspect_ratio = height/width
+	new_height = aspect_ratio * new_width * 0.55
+	img = img.resize((new_width, int(new_height)))
+
+	# replace each pixel with a character from array, all at once with a lookup table
+	chars = _ASCII_LUT[np.asarray(img.convert("L"))]
+	if colour is None:
+		for row in chars:
+			yield row.tobytes().decode("ascii")
+		return
+
+	cube = _CUBE_INDEX[np.asarray(img.convert("RGB"))]
+	cube = cube[..., 0] * 36 + cube[..., 1] * 6 + cube[..., 2]
+	for row, colours in zip(chars, cube):
+		text = row.tobytes().decode("ascii")
+		starts = np.flatnonzero(np.diff(colours, prepend=-1)).tolist() # a new tag only when colour changes
+		runs = zip(starts, starts[1:] + [len(text)])
+		if colour == "ansi":
+			yield "".join(f"\x1b[38;5;{16 + colours[a]}m{text[a:b]}" for a, b in runs) + "\x1b[0m"
+		else:
+			yield "".join(f'<span style="color:#{_CUBE_HEX[colours[a]]}">{html.escape(text[a:b])}</span>' for a, b in runs)
+
+def ascii_image(img:Image, new_width:int = 120, colour:Optional[str] = None) -> str:
+	"""ascii art of an image; with `colour="html"` a whole html page is returned"""
+	out = "\n".join(ascii_rows(img, new_width, colour))
+	if colour == "html":
+		return HTML_HEAD + out + HTML_TAIL
+	return out
+
+def zalgofy(text:str, noise:int = 1, damage:float = 0.0, max_accents:int = 10) -> str:
+	z = zalgo.zalgo()
+	z.maxAccentsPerLetter = max_accents
+	z.numAccentsUp = ( 1+ int(damage*noise), 3 * noise )
+	z.numAccentsDown = ( 1+ int(damage*noise), 3 * noise )
+	z.numAccentsMiddle = ( 1+ int(damage*noise), 2 * noise )
+	return z.zalgofy(text)
+
+def random_case(text:str) -> str:
+	msg = "" # omg this part is done so badly
+	val = 0  # but I want a kinda imbalanced random
+	upper = False
+	for c in text:
+		val = secrets.randbelow(4)
+		if val > 2:
+			msg += c.upper()
+			upper = True
+		elif val < 1:
+			msg += c
+			upper = False
+		else:
+			if upper:
+				msg += c
+				upper = False
+			else:
+				msg += c.upper()
+				upper = True
+	return msg
+
+def figlet(text:str, font:str = "slant", width:int = 30) -> str:
+	return pyfiglet.figlet_format(text, font=font, width=width)
+
+def make_qrcode(text:str, size:Optional[int] = None, box_size:int = 10, border:int = 4,
+					fg_color:str = "white", bg_color:str = "black") -> io.BytesIO:
+	qr = qrcode.QRCode(
+		version=size,
+		error_correction=qrcode.constants.ERROR_CORRECT_L,
+		box_size=box_size,
+		border=border,
+	)
+	qr.add_data(text)
+	qr.make(fit=True)
+
+	image = qr.make_image(fill_color=fg_color, back_color=bg_color)
+	qr_io = io.BytesIO()
+	qr_io.name = "qrcode.jpg"
+	image.save(qr_io, "JPEG")
+	qr_io.seek(0)
+	return qr_io
+
+def roll_dice(times:int, maxval:int) -> List[int]:
+	return [ secrets.randbelow(maxval) + 1 for _ in range(times) ]
+
+def pick_choices(choices:Sequence[Any], times:int) -> Tuple[List[Any], List[Any]]:
+	"""pick `times` random choices, return picks and most picked ones (all tied ones)"""
+	res = [ secrets.choice(choices) for _ in range(times) ]
+	if not res:
+		return res, []
+	res_count = Counter(res).most_common()
+	max_times = res_count[0][1]
+	return res, [ el for el, n in res_count if n == max_times ]
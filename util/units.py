@@ -0,0 +1,59 @@
+import re
+import functools
+
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Tuple
+
+import numpy as np
+
+from unit_converter.converter import converts
+
+MAX_BATCH = 1000
+RANGE = re.compile(r"^(?P<start>[-+0-9.eE]+)\.\.(?P<stop>[-+0-9.eE]+)(?::(?P<step>[-+0-9.eE]+))?$")
+
+@functools.lru_cache(maxsize=256)
+def unit_map(src:str, dst:str) -> Optional[Tuple[Decimal, Decimal]]:
+	"""find (scale, offset) so that `dst = src * scale + offset`
+
+	Units are parsed only once per pair: 0 and 1 are converted to find scale and offset, and 2 to verify \
+	that the conversion is really linear. Returns None if it isn't (or can't be probed), callers should fall \
+	back to `converts` for such pairs.
+	"""
+	try:
+		zero, one, two = ( Decimal(converts(f"{v} {src}", dst)) for v in (0, 1, 2) )
+	except (InvalidOperation, ZeroDivisionError, ArithmeticError):
+		return None
+	scale = one - zero
+	if abs(two - (2 * scale + zero)) > abs(scale) * Decimal("1e-9"):
+		return None
+	return scale, zero
+
+def convert_value(value:str, src:str, dst:str) -> str:
+	mapping = unit_map(src, dst)
+	if mapping is None:
+		return converts(f"{value} {src}", dst)
+	scale, offset = mapping
+	return str(Decimal(value) * scale + offset)
+
+def parse_values(text:str) -> np.ndarray:
+	"""parse a range (`0..100:10`, step defaults to 1) or a comma separated list (`1,2.5,3`) of values"""
+	match = RANGE.match(text)
+	if match:
+		start, stop = float(match["start"]), float(match["stop"])
+		step = float(match["step"] or 1.0)
+		if step == 0 or (stop - start) / step < 0:
+			raise ValueError("Invalid range step")
+		if (stop - start) / step >= MAX_BATCH:
+			raise ValueError(f"Too many values, max is {MAX_BATCH}")
+		return start + step * np.arange(int((stop - start) / step + 1e-9) + 1)
+	values = np.array([ float(v) for v in text.split(",") if v.strip() ])
+	if len(values) > MAX_BATCH:
+		raise ValueError(f"Too many values, max is {MAX_BATCH}")
+	return values
+
+def convert_batch(values:np.ndarray, src:str, dst:str) -> np.ndarray:
+	mapping = unit_map(src, dst)
+	if mapping is None: # not linear, convert one by one
+		return np.array([ float(converts(f"{v} {src}", dst)) for v in values ])
+	scale, offset = mapping
+	return values * float(scale) + float(offset)
@@ -0,0 +1,77 @@
+import asyncio
+
+from typing import Dict, List, Optional, Any
+
+import aiohttp
+
+from .cache import TTLCache
+
+API_URL = "https://{lang}.wikipedia.org/w/api.php"
+HEADERS = {"User-Agent": "alemibot-tricks (https://github.com/alemidev/abot-tricks)"}
+BATCH_SIZE = 20   # max intro extracts returned by TextExtracts in a single request
+MAX_EXCHARS = 1200 # TextExtracts won't truncate to more characters than this
+
+# (lang, normalized title) -> { "title", "url", "text", "full" } or None if page doesn't exist
+WIKI_CACHE = TTLCache(maxsize=512, ttl=3600)
+MISSING_TTL = 300
+
+def normalize_title(title:str) -> str:
+	title = " ".join(title.replace("_", " ").split())
+	return title[:1].upper() + title[1:]
+
+def _enough(page:Optional[Dict[str, Any]], limit:int) -> bool:
+	return page is None or page["full"] or len(page["text"]) >= limit
+
+async def _query(session:aiohttp.ClientSession, lang:str, **params) -> Dict[str, Any]:
+	params.update(action="query", format="json", formatversion="2", redirects="1", explaintext="1")
+	async with session.get(API_URL.format(lang=lang), params=params, headers=HEADERS) as res:
+		res.raise_for_status()
+		return await res.json()
+
+async def _fetch_intros(session:aiohttp.ClientSession, lang:str, titles:List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+	data = await _query(session, lang, prop="extracts|info", inprop="url", exintro="1",
+								exlimit=str(BATCH_SIZE), titles="|".join(titles))
+	query = data.get("query", {})
+	alias = { t : t for t in titles }
+	for step in ("normalized", "redirects"): # follow title normalization and then redirects
+		moves = { m["from"] : m["to"] for m in query.get(step, []) }
+		alias = { k : moves.get(v, v) for k, v in alias.items() }
+	pages = { p["title"] : p for p in query.get("pages", []) }
+	out : Dict[str, Optional[Dict[str, Any]]] = {}
+	for title in titles:
+		page = pages.get(alias[title])
+		if page is None or page.get("missing") or page.get("invalid"):
+			out[title] = None
+		else:
+			out[title] = { "title": page["title"], "url": page["fullurl"], "text": page.get("extract", ""), "full": False }
+	return out
+
+async def _fetch_extract(session:aiohttp.ClientSession, lang:str, page:Dict[str, Any], limit:int):
+	params : Dict[str, str] = { "prop": "extracts", "titles": page["title"] }
+	if limit <= MAX_EXCHARS:
+		params["exchars"] = str(limit)
+	data = await _query(session, lang, **params)
+	pages = data.get("query", {}).get("pages", [])
+	if pages and "extract" in pages[0]:
+		page["text"] = pages[0]["extract"]
+		page["full"] = "exchars" not in params or len(page["text"]) < limit
+
+async def fetch_pages(session:aiohttp.ClientSession, lang:str, titles:List[str], limit:int = 1000) -> Dict[str, Optional[Dict[str, Any]]]:
+	"""get at least `limit` characters of text for each title
+
+	Intros of all uncached titles are requested in batches of 20, then only pages whose intro is \
+	shorter than `limit` get a second request for a longer extract.
+	Returns a dict mapping each requested title to its page (`title`, `url`, `text`) or None if it doesn't exist.
+	"""
+	keys = { t : (lang, normalize_title(t)) for t in titles }
+	todo = []
+	for key in keys.values():
+		if key[1] and key not in WIKI_CACHE and key[1] not in todo:
+			todo.append(key[1])
+	for i in range(0, len(todo), BATCH_SIZE):
+		intros = await _fetch_intros(session, lang, todo[i:i+BATCH_SIZE])
+		for title, page in intros.items():
+			WIKI_CACHE.set((lang, title), page, ttl=None if page else MISSING_TTL)
+	pages = [ WIKI_CACHE.get(key) for key in set(keys.values()) ]
+	await asyncio.gather(*(_fetch_extract(session, lang, p, limit) for p in pages if not _enough(p, limit)))
+	return { title : WIKI_CACHE.get(key) for title, key in keys.items() }